@@ -1,108 +1,215 @@
 """ Script to extract text from PDF and create a messy text file """
+import os
 import sys
 import re
+import logging
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from pypdf import PdfReader
+import pymupdf
 from src.config import Config
 from src.utils import setup_logger
 
-logger = setup_logger()
+logger = logging.getLogger(__name__)
+
+# Pages with images and less text than this are treated as scanned / graphics-only
+SCANNED_PAGE_MIN_CHARS = 100
+
+def _is_scanned_page(page, text):
+    """ Check if a page is a scanned image or infographic with (almost) no text layer """
+    if text and len(text.strip()) >= SCANNED_PAGE_MIN_CHARS:
+        return False
+    # Only look at the image list when the text layer is (nearly) empty
+    return bool(page.get_images())
+
+# Plain text extraction flags: no ligature / whitespace preservation (the LLM doesn't need either)
+_TEXT_FLAGS = pymupdf.TEXTFLAGS_TEXT & ~pymupdf.TEXT_PRESERVE_LIGATURES & ~pymupdf.TEXT_PRESERVE_WHITESPACE
+
+# Documents with at least this many pages are extracted in a process pool
+PARALLEL_MIN_PAGES = 16
+
+# PDF document opened once per worker process (MuPDF documents can't be shared across processes)
+_worker_doc = None
+
+def _init_worker(pdf_path):
+    """ Open the PDF once for the current (worker) process """
+    global _worker_doc
+    _worker_doc = pymupdf.open(pdf_path)
+
+def _extract_page(i):
+    """ Extract text from a single page, returns (page index, text, skipped) """
+    page = _worker_doc[i]
+    # Extract text from page (MuPDF keeps the natural reading order)
+    try:
+        text = page.get_text("text", flags=_TEXT_FLAGS)
+    except Exception as e:
+        logger.warning(f"Error extracting text from page {i+1}: {e}")
+        text = None
+    
+    # Skip scanned / graphics-only pages early instead of processing them further
+    try:
+        if _is_scanned_page(page, text):
+            return i, None, True
+    except Exception as e:
+        logger.warning(f"Error inspecting page {i+1}: {e}")
+    
+    return i, text, False
+
+def _iter_pages(pdf_path, total_pages):
+    """ Yield (page index, text, skipped) for the first total_pages pages, in page order """
+    if total_pages >= PARALLEL_MIN_PAGES:
+        # Pages are independent - extract them in parallel, results come back in page order
+        workers = min(os.cpu_count() or 1, total_pages)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(str(pdf_path),)) as executor:
+            yield from executor.map(_extract_page, range(total_pages), chunksize=8)
+    else:
+        _init_worker(str(pdf_path))
+        try:
+            for i in range(total_pages):
+                yield _extract_page(i)
+        finally:
+            _worker_doc.close()
+
+# Currency fixes: both $ and ₹ are corrupted to "L" (and ₹ to "j"/"J") during PDF extraction.
+# All rules of a step are fused into one alternation so the text is scanned once per step;
+# alternatives are listed in the original priority order.
+
+# Literal currency glyph variants, normalized with one str.translate pass (no regex needed)
+_CURRENCY_GLYPHS = str.maketrans({'₨': '₹', '＄': '$', '﹩': '$'})
+
+_DIGIT_RE = re.compile(r'\d')
+
+# Amount in Indian (1,23,456) or US (1,234,567) digit grouping
+_AMOUNT = r'\d{1,2}(?:,\d{2})*(?:,\d{3})*(?:\.\d+)?'
+
+# STEP 1 + STEP 2: rupee symbol fixes (Indian context takes priority)
+_RUPEE_RE = re.compile(
+    # "j"/"J", "Rj", "RL", "Rs." or "INR" before numbers means "₹"
+    r'\b(?:[jJ]\s*|R[jJLlsS]\s*\.?\s*|IN[Rr]\s*)(?P<digit>\d)'
+    # L followed by a number with crore/lakh/thousand
+    r'|\b[Ll]\s*(?P<amount>' + _AMOUNT + r')\s*(?P<unit>(?i:crore|lakh|thousand))'
+    # L with Indian comma pattern (e.g., L1,23,456 or L12,34,567) - at least 2 comma groups
+    r'|\bL\s*(?P<indian>\d{1,2}(?:,\d{2}){2,}(?:,\d{3})*(?:\.\d+)?)'
+)
+
+# STEP 3 + STEP 4: dollar symbol fixes for the "L" that are left (US/international context)
+_DOLLAR_RE = re.compile(
+    # "US" followed by "L" means dollar
+    r'\bUS\s*[Ll]\s*(?P<us>\d)'
+    # "L" followed by numbers with "billion" or "million"
+    r'|\b[Ll]\s*(?P<number>\d+\.?\d*)\s*(?P<scale>(?i:billion|million))\b'
+    # "L" with US-style comma pattern (e.g., L1,234 million)
+    r'|\b[Ll]\s*(?P<grouped>\d{1,3}(?:,\d{3})*(?:\.\d+)?)\s*(?P<grouped_scale>(?i:billion|million))\b'
+)
+
+# Lines containing Indian financial terms (rupee context), matched one line at a time
+_INDIAN_LINE_RE = re.compile(
+    r'^(?=[^\n]*\b(?:revenue|profit|asset|debt|equity|turnover|sales|income|expense|investment'
+    r'|capital|fund|contribution|csr|reliance|india|indian)\b)[^\n]*',
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Literal prefilter for _INDIAN_LINE_RE: a page without any of these substrings has no rupee-context line
+# (most frequent first so the common case stops early)
+_INDIAN_KEYWORDS = ('revenue', 'profit', 'asset', 'income', 'capital', 'fund', 'india', 'reliance',
+                    'sales', 'equity', 'debt', 'investment', 'expense', 'turnover', 'contribution', 'csr')
+
+# L before numbers inside a rupee-context line
+_L_TO_RUPEE_RE = re.compile(r'\bL\s*(' + _AMOUNT + r')')
+
+def _indian_line_replacement(match):
+    return _L_TO_RUPEE_RE.sub(r'₹\1', match.group(0))
+
+def _rupee_replacement(match):
+    group = match.lastgroup
+    if group == 'unit':
+        return f"₹{match.group('amount')} {match.group('unit')}"
+    return '₹' + match.group(group)
+
+def _dollar_replacement(match):
+    group = match.lastgroup
+    if group == 'us':
+        return 'US$ ' + match.group('us')
+    if group == 'scale':
+        return f"${match.group('number')} {match.group('scale')}"
+    return f"${match.group('grouped')} {match.group('grouped_scale')}"
+
+def fix_currency_symbols(text):
+    """ Fix currency symbol corruption ($ and ₹ both extracted as "L") based on context """
+    text = text.translate(_CURRENCY_GLYPHS)
+    
+    # Every fix needs a digit after the corrupted symbol - pages without numbers need no scan at all
+    if not _DIGIT_RE.search(text):
+        return text
+    
+    # STEP 1 + 2: Fix rupee symbols FIRST (Indian context takes priority)
+    text = _RUPEE_RE.sub(_rupee_replacement, text)
+    
+    # STEP 2 Pattern 3: L followed by numbers in lines containing Indian financial terms (conservative approach)
+    # If line contains Indian financial terms and "L" before numbers, likely rupee
+    # Only worth scanning when an "L" is left and the page mentions one of the terms at all
+    # (casefold so "ſ" still counts as "s"; re.IGNORECASE also lets dotless/dotted "ı"/"İ" match "i")
+    if 'L' in text:
+        lowered = text.casefold()
+        if (any(keyword in lowered for keyword in _INDIAN_KEYWORDS)
+                or 'ı' in text or 'İ' in text):
+            text = _INDIAN_LINE_RE.sub(_indian_line_replacement, text)
+    
+    # STEP 3 + 4: Only fix remaining "L" that are clearly in US/international context
+    # Be conservative - "L" meaning "Lakh" in text is left alone
+    # Dollar fixes only exist next to "US" or "billion"/"million", skip the scan when neither literal is present
+    if 'US' in text or 'illion' in text.lower():
+        text = _DOLLAR_RE.sub(_dollar_replacement, text)
+    return text
 
 def extract_messy_text(pdf_path, output_path, pages=5):
     """ Extract text from PDF and create a messy text file """
     try:
 
         logger.info(f"Reading PDF from {pdf_path}...")
-        reader = PdfReader(pdf_path)
+        # PyMuPDF (MuPDF C backend) is much faster than pypdf's pure-Python parser
+        with pymupdf.open(str(pdf_path)) as doc:
+            total_pages = min(pages, doc.page_count)
         
-        text_content = []
-        total_pages = min(pages, len(reader.pages))
+        skipped_pages = []
+        total_chars = 0
         
         logger.info(f"Extracting text from first {total_pages} pages...")
         
-        for i in range(total_pages):
-            page = reader.pages[i]
-            # Extract text from page
-            try:
-                text = page.extract_text()
-            except Exception as e:
-                logger.warning(f"Error extracting text from page {i+1}: {e}")
-                text = None
-            
-            if text:
-                # Normalize text encoding to preserve special characters
-                # This helps preserve the original intent before further processing
-                try:
-                    text = text.encode('utf-8', errors='replace').decode('utf-8')
-                except Exception as e:
-                    logger.warning(f"Error encoding text from page {i+1}: {e}")
-                    # Continue with text as-is if encoding fails
-                
-                # Make it messy - add some formatting issues
-                messy_text = f"--- PAGE {i+1} ---\n{text}\n\n"
-                text_content.append(messy_text)
-        
-        full_text = "\n".join(text_content)
-        
         # Fix currency symbol corruption from PDF extraction
         # CRITICAL: Both $ and ₹ are corrupted to "L" during PDF extraction
         # We need to distinguish based on context (Indian vs US context)
-        logger.info("Fixing currency symbol corruption (both $ and ₹ corrupted to 'L')...")
-        
-        # STEP 1: Fix rupee symbol issues FIRST (Indian context takes priority)
-        # Pattern: "j" or "J" before numbers likely means "₹" (if not already corrupted to L)
-        full_text = re.sub(r'\b([jJ])\s*(\d)', r'₹\2', full_text)
-        # Fix "Rs." that got corrupted to "Rj" or "RL" or similar
-        full_text = re.sub(r'\bR[jJ]\s*\.?\s*(\d)', r'₹\1', full_text)
-        full_text = re.sub(r'\bR[Ll]\s*\.?\s*(\d)', r'₹\1', full_text)
-        # Fix "INR" or "Rs" that might be corrupted
-        full_text = re.sub(r'\bIN[Rr]\s*(\d)', r'₹\1', full_text)
-        full_text = re.sub(r'\bR[sS]\s*\.?\s*(\d)', r'₹\1', full_text)
-        
-        # STEP 2: Fix "L" that represents rupee (₹) - Indian context indicators
-        # Priority: Fix rupee symbols FIRST based on Indian context
-        # Indian numbering pattern: L1,23,456 or L1,23,456.78 (comma-separated in Indian format)
-        # Pattern 1: L followed by Indian numbering (1,23,456 format) with crore/lakh
-        full_text = re.sub(r'\bL\s*(\d{1,2}(?:,\d{2})*(?:,\d{3})*(?:\.\d+)?)\s*(crore|lakh|thousand)', r'₹\1 \2', full_text, flags=re.IGNORECASE)
-        # Pattern 2: L with Indian comma pattern (e.g., L1,23,456 or L12,34,567) - at least 2 comma groups
-        full_text = re.sub(r'\bL\s*(\d{1,2}(?:,\d{2}){2,}(?:,\d{3})*(?:\.\d+)?)', r'₹\1', full_text)
-        # Pattern 3: L followed by numbers in lines containing Indian financial terms (conservative approach)
-        # Split into sentences/lines and check context
-        lines = full_text.split('\n')
-        fixed_lines = []
-        for line in lines:
-            # If line contains Indian financial terms and "L" before numbers, likely rupee
-            if re.search(r'\b(revenue|profit|asset|debt|equity|turnover|sales|income|expense|investment|capital|fund|contribution|csr|reliance|india|indian)\b', line, re.IGNORECASE):
-                # Fix L before numbers in this line
-                line = re.sub(r'\bL\s*(\d{1,2}(?:,\d{2})*(?:,\d{3})*(?:\.\d+)?)', r'₹\1', line)
-            fixed_lines.append(line)
-        full_text = '\n'.join(fixed_lines)
+        # Fixes never cross page boundaries, so they are applied page by page
+        currency_fix = Config.CURRENCY_FIX
+        if currency_fix:
+            logger.info("Fixing currency symbol corruption (both $ and ₹ corrupted to 'L')...")
+        else:
+            logger.info("Currency symbol fix disabled (Config.CURRENCY_FIX = False)")
         
-        # STEP 3: Fix "L" that represents dollar ($) - US/international context
-        # Only fix remaining "L" that are clearly in US/international context
-        # Pattern: "US" followed by "L" means dollar
-        full_text = re.sub(r'\bUS\s*([Ll])\s*(\d)', r'US$ \2', full_text)
-        # Pattern: "L" followed by numbers with "billion" or "million" (US context)
-        full_text = re.sub(r'\b([Ll])\s*(\d+\.?\d*)\s*(billion|million)\b', r'$\2 \3', full_text, flags=re.IGNORECASE)
-        # Pattern: "L" with US-style comma pattern (e.g., L1,234,567) - but only if not already fixed as rupee
-        # This is tricky - we need to be careful not to override rupee fixes
-        # Only apply if it's clearly US context (no Indian financial terms nearby)
+        # Stream every page straight to the file instead of buffering the whole document
+        with open(output_path, 'w', encoding='utf-8') as f:
+            for i, text, skipped in _iter_pages(pdf_path, total_pages):
+                if skipped:
+                    skipped_pages.append(i + 1)
+                    continue
+                
+                # MuPDF already returns a proper str, special characters need no re-encoding
+                if text:
+                    # Make it messy - add some formatting issues
+                    messy_text = f"--- PAGE {i+1} ---\n{text}\n\n\n"
+                    if currency_fix:
+                        messy_text = fix_currency_symbols(messy_text)
+                    f.write(messy_text)
+                    total_chars += len(messy_text)
         
-        # STEP 4: Fix any remaining standalone "L" before numbers that weren't caught
-        # This should be minimal after the above fixes
-        # Only fix if it's clearly a currency symbol (not "L" meaning "Lakh" in text)
-        # Look for patterns like "L 123" or "L123" where L is likely a currency symbol
-        # But be conservative - only fix if it's in a financial context
-        full_text = re.sub(r'\b([Ll])\s*(\d{1,3}(?:,\d{3})*(?:\.\d+)?)\s*(billion|million)\b', r'$\2 \3', full_text, flags=re.IGNORECASE)
+        if skipped_pages:
+            logger.info(f"Skipped {len(skipped_pages)} scanned/image-only pages: {skipped_pages}")
         
-        logger.info("Currency symbol fixes applied (rupee priority, then dollar)")
-        
-        # Write to file
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(full_text)
+        if currency_fix:
+            logger.info("Currency symbol fixes applied (rupee priority, then dollar)")
         
         logger.info(f"Created messy text file: {output_path}")
-        logger.info(f"Total characters: {len(full_text)}")
+        logger.info(f"Total characters: {total_chars}")
         return output_path
         
     except Exception as e:
@@ -111,6 +218,8 @@ def extract_messy_text(pdf_path, output_path, pages=5):
 
 if __name__ == "__main__":
 
+    setup_logger()
+
     # Path to PDF where annual report is stored    
     pdf_path = Path("PDF/RIL-Integrated-Annual-Report-2024-25.pdf")
     
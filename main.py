@@ -1,5 +1,9 @@
 # Main File to run the entire script
 import json
+try:
+    import orjson  # Rust JSON serializer, much faster than the stdlib for large graphs
+except ImportError:
+    orjson = None
 # Path setup happens automatically when src is imported (see src/__init__.py)
 from src.config import Config
 from src.data_loader import PDFLoader
@@ -39,6 +43,7 @@ def main():
         # once tokenized completed you will get the text clean with out white spaces and new lines and 
         # you can also see the text of the chunk and the number of characters in the chunk also the chunk count
         processed_text = tokenized_data['text']
+        text_chunks = [c['text'] for c in tokenized_data.get('chunks', [])]
         
         # The original length and processed length is stored against result dictionary
         logger.info(f"Text processed: {tokenized_data['original_length']} -> {tokenized_data['processed_length']} characters")
@@ -46,11 +51,13 @@ def main():
             logger.info(f"Text chunked into {tokenized_data['chunk_count']} chunks")
     else:
         processed_text = raw_text
+        text_chunks = None
         logger.info("Tokenization skipped, using raw text")
 
     # 3. Extract Info via LLM
-    detective = FinancialDetective()
-    graph_data = detective.analyze(processed_text)
+    detective = FinancialDetective(cache_dir=Config.CACHE_DIR)
+    # Reuse the tokenizer's chunks instead of chunking the text a second time
+    graph_data = detective.analyze(processed_text, chunks=text_chunks)
     logger.info(f"Graph data: {graph_data}")
     # Validate minimum requirements
     num_entities = len(graph_data.get('entities', []))
@@ -61,8 +68,12 @@ def main():
     
     # 4. Save JSON Output
     json_path = Config.get_output_path(Config.JSON_FILENAME)
-    with open(json_path, 'w') as f:
-        json.dump(graph_data, f, indent=2)
+    if orjson is not None:
+        with open(json_path, 'wb') as f:
+            f.write(orjson.dumps(graph_data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(graph_data, f, indent=2, ensure_ascii=False)
     logger.info(f"JSON data saved to {json_path}")
 
     # 5. Generate Visualization
@@ -9,16 +9,11 @@ How it works:
 """
 import sys
 from pathlib import Path
-import os
 
 
-_project_root = Path(__file__).resolve().parent.parent
-_project_root_str = str(_project_root)
-_project_root_normalized = os.path.normpath(_project_root_str)
+_project_root_str = str(Path(__file__).resolve().parent.parent)
 
-# Normalize all existing paths for comparison (handles Windows/Unix differences)
-_normalized_paths = [os.path.normpath(p) for p in sys.path]
-
-# Add to path if not already there (check normalized versions)
-if _project_root_normalized not in _normalized_paths:
+# Add to path if not already there (entries of sys.path are plain strings within one process,
+# so a direct membership check is enough - no need to normalize every entry)
+if _project_root_str not in sys.path:
     sys.path.insert(0, _project_root_str)
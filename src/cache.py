@@ -0,0 +1,65 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from .utils import parse_llm_json
+
+logger = logging.getLogger(__name__)
+
+class ExtractionCache:
+    """
+    On-disk cache of validated extraction results.
+    Keys are (prompt_version, digest) pairs, stored as <cache_dir>/<prompt_version>/<digest>.json
+    so changing the prompt starts a fresh namespace instead of serving stale graphs.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+
+    @staticmethod
+    def make_key(*parts):
+        """ SHA-256 over the parts, each length-prefixed (8 bytes) so ("ab", "c") != ("a", "bc") """
+        digest = hashlib.sha256()
+        for part in parts:
+            data = part.encode('utf-8')
+            digest.update(len(data).to_bytes(8, 'little'))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        prompt_version, digest = key
+        return self.cache_dir / prompt_version / f"{digest}.json"
+
+    def get(self, key):
+        """ Return the cached graph for key, or None on a miss or an unusable entry """
+        path = self._path(key)
+        try:
+            # Read as bytes - parse_llm_json (orjson when installed) decodes UTF-8 itself
+            with open(path, 'rb') as f:
+                result = parse_llm_json(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+        # Re-validate the shape - a hand-edited or truncated file must not reach the graph builder
+        if (not isinstance(result, dict) or not isinstance(result.get('entities'), list)
+                or not isinstance(result.get('relationships'), list)):
+            logger.warning(f"Ignoring malformed cache entry {path}")
+            return None
+        return result
+
+    def put(self, key, result):
+        """ Store a graph for key (written to a temp file first so readers never see a partial entry) """
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # Caching is best-effort, the extraction result is still returned
+            logger.warning(f"Could not write cache entry {path}: {e}")
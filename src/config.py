@@ -1,34 +1,89 @@
 import os
 import sys
+from pathlib import Path
 
 class Config:
 
     # Local messy text file (extracted from PDF)
     MESSY_TEXT_FILE = "data/messy_text.txt"
     
+    # PDF Extraction Settings
+    # Fix "L"/"J" currency corruption (-> ₹ / $) while extracting. Only needed when the consumer
+    # must see the right symbol (JSON output, graph labels) - the LLM itself copes with "L"/"J"
+    CURRENCY_FIX = True
+    
     # LLM API URL 
     LLM_API_URL = "http://10.173.119.32:443/v1"
     LLM_MODEL_NAME = "gemma3:12b"
-    MAX_TOKENS = 6000
     temperature = 0.1
+    
+    # LLM context budget (tokens): system message + text chunk + response must fit the model window
+    LLM_CONTEXT_WINDOW = 16384
+    MAX_TOKENS = 4000  # Response budget - a chunk's JSON graph stays well below this
+    # Characters per token assumed for number-heavy report text (no tokenizer for the served model here)
+    CHARS_PER_TOKEN = 3
+    # System message (extraction prompt + JSON-only instruction, 6,427 chars with the default prompt)
+    PROMPT_TOKENS = 6500 // CHARS_PER_TOKEN
+    # Room for the rest of a request: the existing-entity note, batch instructions and segment headers, and up to
+    # LLM_VALIDATION_RETRIES feedback turns (each an LLM_FEEDBACK_CHARS answer tail plus the validation error)
+    PROMPT_MARGIN_TOKENS = 2000
+    # Largest text the engine sends in one request - longer chunks are split to this size before sending
+    MAX_CONTEXT_CHARS = (LLM_CONTEXT_WINDOW - PROMPT_TOKENS - PROMPT_MARGIN_TOKENS - MAX_TOKENS) * CHARS_PER_TOKEN
+    # Use the compact extraction prompt (same rules, each list stated once - about a third of the prompt tokens)
+    COMPACT_PROMPT = False
+    # Stream LLM responses (sync path) - keeps the partial answer if the connection drops mid-response,
+    # and stops reading (and generating) once the JSON answer is complete
+    LLM_STREAM = False
+    # Ask the server for JSON mode (response_format json_object) - the decoder can then only produce valid JSON.
+    # Supported by OpenAI, vLLM, llama.cpp and Ollama; servers without it reject the request
+    LLM_JSON_MODE = False
+    # Times an invalid LLM response is re-requested with the validation error as feedback
+    LLM_VALIDATION_RETRIES = 2
+    # Characters of a rejected answer replayed with the feedback (its end, where a cut-off answer broke)
+    LLM_FEEDBACK_CHARS = 1500
+    # Number of chunks sent to the LLM at the same time (1 = sequential, passes already-extracted entities to each prompt)
+    LLM_MAX_CONCURRENCY = 4
+    # Chunks sent together in one LLM request (prompt paid once per request). 1 = one chunk per request;
+    # a batch must fit MAX_CONTEXT_CHARS and its answer (one graph per chunk) the MAX_TOKENS response budget
+    CHUNKS_PER_LLM_CALL = 1
+    # Already-extracted entity names listed in each sequential chunk's prompt (the rest are only counted)
+    EXISTING_CONTEXT_NAMES = 10
+    # Server rate limits - requests wait for budget instead of being rejected with 429s (None = no limit)
+    LLM_MAX_REQUESTS_PER_MINUTE = None
+    LLM_MAX_TOKENS_PER_MINUTE = None
+    # Talk HTTP/2 to the LLM server (concurrent chunk requests share one connection) - needs the h2 package
+    LLM_HTTP2 = True
 
     # Output Paths
     OUTPUT_DIR = "output"
     JSON_FILENAME = "graph_output.json"
     GRAPH_FILENAME = "knowledge_graph.png"
+    # Graph image resolution - the figures are 30-60 inches wide, so 150 DPI is already 4500+ pixels across
+    FIG_DPI = 150
     LOG_FILENAME = "financial_detective.log"
+    # Extraction cache - re-running on the same text skips the LLM entirely (None to disable)
+    CACHE_DIR = os.path.join(OUTPUT_DIR, "cache")
+    # Also cache each chunk's extraction, so chunks repeated across documents (boilerplate) skip the LLM
+    CACHE_CHUNKS = True
+    # Extractions kept in memory per FinancialDetective, so repeated texts in one process skip the LLM (0 to disable)
+    MEMORY_CACHE_SIZE = 1024
     
     # Tokenization Settings
     TOKENIZE_TEXT = True  # Enable text tokenization/cleaning
     CLEAN_TEXT = True  # Enable text cleaning (set to False to preserve original text structure)
     CHUNK_TEXT = True  # Enable text chunking (set to True for very long texts)
-    CHUNK_SIZE = 4000  # Maximum characters per chunk
-    CHUNK_OVERLAP = 300  # Characters to overlap between chunks
+    CHUNK_SIZE = 12000  # Maximum characters per chunk (CHUNK_SIZE // CHARS_PER_TOKEN = ~4,000 tokens, inside MAX_CONTEXT_CHARS)
+    CHUNK_OVERLAP = min(300, CHUNK_SIZE // 20)  # Characters to overlap between chunks
     CHUNK_STRATEGY = "sentence"  # Options: "sentence", "paragraph", "fixed"
     
+    # Set once the output directory has been created for this process
+    _output_dir_ready = False
+    
     @classmethod
     def get_output_path(cls, filename):
-        if not os.path.exists(cls.OUTPUT_DIR):
-            os.makedirs(cls.OUTPUT_DIR)
+        if not cls._output_dir_ready:
+            # One mkdir call (no exists check), later calls are plain path joins
+            Path(cls.OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
+            cls._output_dir_ready = True
         return os.path.join(cls.OUTPUT_DIR, filename)
     
\ No newline at end of file
@@ -1,8 +1,9 @@
+import logging
+import mmap
 from pathlib import Path
-from .utils import setup_logger
 from .config import Config
 
-logger = setup_logger()
+logger = logging.getLogger(__name__)
 
 class PDFLoader:
     
@@ -30,8 +31,17 @@ class PDFLoader:
             
             logger.info(f"Reading messy text file from {file_path}...")
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                text = f.read()
+            # Decode straight from a memory-mapped view of the file (no intermediate bytes copy)
+            with open(file_path, 'rb') as f:
+                if file_path.stat().st_size == 0:
+                    text = ""
+                else:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        text = str(mm, 'utf-8')
+            
+            # Same newline handling as reading the file in text mode
+            if '\r' in text:
+                text = text.replace('\r\n', '\n').replace('\r', '\n')
             
             logger.info(f"Loaded {len(text)} characters from text file.")
             return text
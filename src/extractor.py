@@ -1,85 +1,72 @@
-import json
+import asyncio
+import hashlib
+import logging
+import textwrap
 import time
+from collections import OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+try:
+    import json_repair  # Optional: salvages truncated / slightly malformed LLM JSON
+except ImportError:
+    json_repair = None
+from openai import APIConnectionError
+from .cache import ExtractionCache
 from .llm_engine import LLMEngine
-from .utils import setup_logger, clean_json_string
+from .models import salvage_extraction, validate_extraction
+from .utils import extract_json_object, is_complete_json_object
 from .config import Config
 
-logger = setup_logger()
+logger = logging.getLogger(__name__)
 
-class FinancialDetective:
-    
-    def __init__(self):
-        self.llm = LLMEngine()
-
-    def get_extraction_prompt(self, existing_entities=None):
-        """
-        Generate extraction prompt, optionally with context about already extracted entities.
-        """
-        existing_context = ""
-        if existing_entities and len(existing_entities) > 0:
-            # Show first few entities to give context
-            sample_entities = list(existing_entities)[:10]
-            existing_context = f"""
-            IMPORTANT - AVOID DUPLICATES:
-            The following entities have already been extracted in previous chunks. DO NOT extract them again unless you find NEW information:
-            {', '.join(sample_entities)}
-            ... and {len(existing_entities) - len(sample_entities)} more entities.
-
-            Focus on extracting ONLY NEW entities and relationships that haven't been extracted yet.
-            """
-        
-        return f"""
+# Extraction prompt, built once at import (each rule / example list stated once, indentation stripped). It goes
+# into the system message unchanged on every call, so the server can reuse its cached prefix; everything
+# per-chunk goes into the user message
+_EXTRACTION_PROMPT = textwrap.dedent("""
           You are an expert Financial Knowledge Graph Extractor. Extract entities and relationships from the financial text below.
 
           ⛔ CRITICAL RULES:
           1. Output ONLY valid JSON - no markdown code blocks, no explanations, no text before or after
-          2. Start with {{ and end with }}
+          2. Start with { and end with }
           3. Extract ONLY NEW information - avoid extracting entities/relationships already extracted
           4. Use the EXACT schema below - no variations
           5. Focus on entities and relationships that are clearly mentioned in THIS text segment
-          {existing_context}
-          6. ⚠️ CRITICAL: MUST extract Company -> OWNS -> Company relationships when mentioned:
-             - If text says "subsidiary", "owns", "acquired", "stake in", "business unit", "division" → extract OWNS relationship
-             - Examples: "Reliance Industries Limited owns Jio" → Reliance Industries Limited -> OWNS -> Jio
-             - Examples: "Reliance Retail is a subsidiary" → Reliance Industries Limited -> OWNS -> Reliance Retail
-             - Examples: "Hamleys is owned by Reliance" → Reliance Industries Limited -> OWNS -> Hamleys
+          6. ⚠️ CRITICAL: MUST extract Company -> OWNS -> Company relationships when mentioned (see OWNS below)
           7. RIL / Reliance / Reliance Industries Limited are same company - extract only ONE as "Reliance Industries Limited"
           8. Person names: "Shri Dhirubhai Ambani" = "Shri. Dhirubhai H. Ambani" = "Dhirubhai H. Ambani" - extract only ONE (use "Dhirubhai H. Ambani" without title)
           9. Person names: "Mukesh D. Ambani" = "Shri Mukesh D. Ambani" - extract only ONE (use "Mukesh D. Ambani" without title)
-          10. DO NOT extract dates (FY 2024-25, CY24, March 31, 2025) as entities
-          11. DO NOT extract events (Mahakumbh, festivals) as entities
-          12. DO NOT extract documents (Annual Report) as entities
-          13. Focus on Companies, People, Dollar Amounts, and Risks only
-          14. Focus max 3 entites and 3 relationships during extraction
+          10. DO NOT extract dates, events or documents as entities (see the list below)
+          11. Focus on Companies, People, Dollar Amounts, and Risks only
+          12. Focus max 3 entites and 3 relationships during extraction
                 
         ENTITY TYPES TO EXTRACT (BE PRECISE):
         - Company: All company names, subsidiaries, joint ventures, associates, business units, divisions
           ⚠️ IMPORTANT: When you see a company name mentioned as a subsidiary, business unit, or division of another company, 
             extract BOTH companies AND create an OWNS relationship between them
-        - Person: Key personnel (Founders, Managing Directors) - use names WITHOUT titles (e.g., "Mukesh D. Ambani" NOT "Shri Mukesh D. Ambani", "Dhirubhai H. Ambani" NOT "Shri Dhirubhai Ambani")
+        - Person: Key personnel (Founders, Managing Directors) - use names WITHOUT titles (rules 8 and 9)
         - Dollar Amount: ONLY financial figures with currency symbols (₹, $, L, J) and units (crore, million, billion)
         - Risk: Risk factors, challenges, threats (e.g., "Market volatility risk", "Regulatory compliance risk")
         - Extract maximum 5 entities and 5 relationships
 
         ⛔ DO NOT EXTRACT AS ENTITIES (CRITICAL):
-        - Dates: "March 31, 2025", "FY 2024-25", "CY24", "2024", "2025" - these are NOT entities
+        - Dates / fiscal years: "March 31, 2025", "FY 2024-25", "CY24", "2024", "2025" - these are NOT entities
         - Events: "Mahakumbh", festivals, ceremonies - these are NOT entities
         - Documents: "Annual Report", "Integrated Report" - these are NOT entities
         - Locations: "India", cities, countries - only extract if mentioned with financial data
         - Percentages: "5.7%", "10%" - these are metrics, not dollar amounts
-        - Fiscal years: "FY 2024-25" - this is a date, NOT an entity
-        - Dhirubhai H. Ambani: this is a person, NOT an entity and shri Dhirubhai H. Ambani and Dhirubhai H. Ambani both are same person.
 
         RELATIONSHIP TYPES TO IDENTIFY (IMPORTANT - CORRECT DIRECTION):
         - ⚠️ OWNS: Company -> OWNS -> Company (HIGHEST PRIORITY - extract whenever mentioned!)
-          Examples: 
+          Keywords: "subsidiary", "owns", "owned by", "acquired", "stake in", "business unit", "division", "segment"
+          Extract BOTH companies as entities, then Parent Company -> OWNS -> Subsidiary/Unit. Examples:
           * "Reliance Industries Limited owns Jio" → Reliance Industries Limited -> OWNS -> Jio
           * "Reliance Retail is a subsidiary" → Reliance Industries Limited -> OWNS -> Reliance Retail
           * "Hamleys is owned by Reliance" → Reliance Industries Limited -> OWNS -> Hamleys
           * "Reliance has a stake in Disney" → Reliance Industries Limited -> OWNS -> Disney
           * "Digital Services division" → Reliance Industries Limited -> OWNS -> Digital Services
           * "Oil and Gas business unit" → Reliance Industries Limited -> OWNS -> Oil and Gas
-        - FOUNDER: Person -> FOUNDER -> Company (e.g., Shri Dhirubhai H. Ambani -> FOUNDER -> Reliance Industries Limited)
+        - FOUNDER: Person -> FOUNDER -> Company (e.g., Dhirubhai H. Ambani -> FOUNDER -> Reliance Industries Limited)
         - MANAGING_DIRECTOR: Person -> MANAGING_DIRECTOR -> Company
         - FACES_RISK: Company -> FACES_RISK -> Risk Factor
         - HAS_REVENUE: Company -> HAS_REVENUE -> Dollar Amount (NOT the reverse!)
@@ -92,282 +79,475 @@ class FinancialDetective:
 
         CRITICAL - RELATIONSHIP DIRECTIONS:
         - Financial relationships (HAS_REVENUE, HAS_PROFIT, etc.) ALWAYS go: Company -> relation -> Dollar Amount
-        - NEVER: Dollar Amount -> HAS_REVENUE -> Company (WRONG!)
-        - NEVER: Company -> HAS_REVENUE -> Person (WRONG! Persons cannot be financial amounts)
-        - NEVER: Company -> HAS_PROFIT -> Person (WRONG! Persons cannot be financial amounts)
-        - ONLY Companies can have financial relationships (HAS_REVENUE, HAS_PROFIT, etc.)
-        - Financial relationships can ONLY target Dollar Amount or Metric entities, NEVER Person, Company, Location, etc.
-        - Events, Dates, Locations, Persons CANNOT be targets of financial relationships
+        - ONLY Companies can have financial relationships, and they can ONLY target Dollar Amount or Metric entities
+        - Events, Dates, Locations, Persons, Companies CANNOT be targets of financial relationships
+        - NEVER: Dollar Amount -> HAS_REVENUE -> Company (WRONG DIRECTION!)
+        - NEVER: Company -> HAS_REVENUE / HAS_PROFIT -> Person (WRONG! Persons cannot be financial amounts)
+        - NEVER: Company -> HAS_REVENUE -> Company (WRONG! Company cannot be a financial amount, use OWNS instead)
+        - NEVER: Event -> HAS_REVENUE -> Company, Date -> HAS_ASSET -> Location (Events / Dates cannot have revenue or assets!)
         
         EXTRACTION REQUIREMENTS:
         1. Extract company names, subsidiaries, and business units (NOT dates, NOT events)
-        2. ⚠️ CRITICAL PRIORITY: Extract Company -> OWNS -> Company relationships:
-           - Look for keywords: "subsidiary", "owns", "owned by", "acquired", "stake in", "business unit", "division", "segment"
-           - Extract BOTH companies as entities
-           - Create OWNS relationship: Parent Company -> OWNS -> Subsidiary/Unit
-           - Examples: 
-             * "Jio is a subsidiary of Reliance" → Extract: Jio (Company), Reliance Industries Limited (Company), Reliance Industries Limited -> OWNS -> Jio
-             * "Reliance Retail division" → Extract: Reliance Retail (Company), Reliance Industries Limited -> OWNS -> Reliance Retail
-             * "Digital Services business" → Extract: Digital Services (Company), Reliance Industries Limited -> OWNS -> Digital Services
+        2. ⚠️ CRITICAL PRIORITY: Extract Company -> OWNS -> Company relationships (see OWNS above)
         3. Extract 5 entities and 5 relationships
         4. Extract financial amounts (revenue, profit, assets, debt, equity) - ONLY amounts with currency symbols
         5. Must Extract risk factors as entities (e.g., Market volatility risk, Regulatory compliance risk)
-        6. Create relationships with CORRECT directions:
-           - Company -> HAS_REVENUE -> Dollar Amount
-           - Company -> HAS_PROFIT -> Dollar Amount
-           - Person -> MANAGING_DIRECTOR -> Company
-           - Person -> FOUNDER -> Company
-           - Company -> OWNS -> Company
-        6. DO NOT create relationships where:
-           - Dollar Amount -> HAS_REVENUE -> Company (WRONG DIRECTION!)
-           - Company -> HAS_REVENUE -> Person (WRONG! Person cannot be a financial amount)
-           - Company -> HAS_PROFIT -> Person (WRONG! Person cannot be a financial amount)
-           - Event -> HAS_REVENUE -> Company (Events cannot have revenue!)
-           - Date -> HAS_ASSET -> Location (Dates cannot have assets!)
-           - Company -> HAS_REVENUE -> Company (WRONG! Company cannot be a financial amount, use OWNS instead)
+        6. Create relationships with the CORRECT directions above
         
         REQUIRED JSON FORMAT:
-        {{
+        {
           "entities": [
-            {{
+            {
               "id": "name of the entity",
               "type": "Company|Person|Location|Dollar Amount|Risk|Product|Framework|Metric",
               "metadata": "Description or context"
-            }}
+            }
           ],
           "relationships": [
-            {{
+            {
               "source": "name of the entity",
               "target": "name of the entity",
               "relation": "OWNS|HAS_PROFIT|CHAIRMAN|FOUNDER|OPERATES|EMPLOYS|LOCATED_IN|FACES_RISK|HAS_REVENUE|HAS_ASSET|HAS_EQUITY|HAS_DEBT"
-            }}
+            }
           ]
-        }}
+        }
         
         EXAMPLE - Company Ownership:
         If text says "Reliance Industries Limited owns Jio and Reliance Retail":
-        {{
+        {
           "entities": [
-            {{"id": "Reliance Industries Limited", "type": "Company", "metadata": "Parent company"}},
-            {{"id": "Jio", "type": "Company", "metadata": "Subsidiary"}},
-            {{"id": "Reliance Retail", "type": "Company", "metadata": "Subsidiary"}}
+            {"id": "Reliance Industries Limited", "type": "Company", "metadata": "Parent company"},
+            {"id": "Jio", "type": "Company", "metadata": "Subsidiary"},
+            {"id": "Reliance Retail", "type": "Company", "metadata": "Subsidiary"}
           ],
           "relationships": [
-            {{"source": "Reliance Industries Limited", "target": "Jio", "relation": "OWNS"}},
-            {{"source": "Reliance Industries Limited", "target": "Reliance Retail", "relation": "OWNS"}}
+            {"source": "Reliance Industries Limited", "target": "Jio", "relation": "OWNS"},
+            {"source": "Reliance Industries Limited", "target": "Reliance Retail", "relation": "OWNS"}
           ]
-        }}
+        }
+        """).strip()
+
+# Same rules with every list stated once (about a third of the size), used when Config.COMPACT_PROMPT is set
+_EXTRACTION_PROMPT_COMPACT = """
+You are an expert Financial Knowledge Graph Extractor. Extract entities and relationships from the financial text.
+
+OUTPUT: ONLY valid JSON (no markdown, no text before or after), starting with { and ending with }, in exactly this schema:
+{"entities": [{"id": "<name>", "type": "<ENTITY TYPE>", "metadata": "<description or context>"}],
+ "relationships": [{"source": "<entity id>", "target": "<entity id>", "relation": "<RELATION>"}]}
+Extract at most 5 entities and 5 relationships, only NEW information clearly stated in THIS text.
+
+ENTITY TYPES: Company | Person | Dollar Amount | Risk | Location | Product | Framework | Metric
+- Company: companies, subsidiaries, joint ventures, associates, business units, divisions
+- Person: founders, managing directors - names WITHOUT titles ("Mukesh D. Ambani", not "Shri Mukesh D. Ambani")
+- Dollar Amount: ONLY figures with a currency symbol (₹, $, L, J) and unit (crore, million, billion); percentages are NOT amounts
+- Risk: risk factors, challenges, threats (e.g. "Market volatility risk")
+- Location: only when mentioned with financial data
+NEVER entities: dates / fiscal years ("March 31, 2025", "FY 2024-25", "CY24", "2025"), events (Mahakumbh, festivals),
+documents ("Annual Report", "Integrated Report").
+
+SAME ENTITY - extract once, using the name given:
+- RIL / Reliance / Reliance Industries Limited -> "Reliance Industries Limited"
+- Shri Dhirubhai Ambani / Shri. Dhirubhai H. Ambani -> "Dhirubhai H. Ambani"
+- Shri Mukesh D. Ambani -> "Mukesh D. Ambani"
+
+RELATIONS (source -> RELATION -> target):
+- Company -> OWNS -> Company (HIGHEST PRIORITY). Whenever the text says "subsidiary", "owns", "owned by", "acquired",
+  "stake in", "business unit", "division" or "segment", extract BOTH companies and the OWNS edge
+  (e.g. "Reliance Retail is a subsidiary" -> Reliance Industries Limited -> OWNS -> Reliance Retail)
+- Person -> FOUNDER | MANAGING_DIRECTOR | CHAIRMAN -> Company
+- Company -> OPERATES | EMPLOYS | LOCATED_IN -> Product / Person / Location
+- Company -> FACES_RISK -> Risk
+- Company -> HAS_REVENUE | HAS_PROFIT | HAS_ASSET | HAS_EQUITY | HAS_DEBT | HAS_EXPORTS | HAS_CSR_CONTRIBUTION -> Dollar Amount
+Financial relations ALWAYS go Company -> relation -> Dollar Amount (or Metric): never reversed, never targeting a
+Person / Company / Location, and never from an Event, Date or Document.
+
+EXAMPLE - "Reliance Industries Limited owns Jio and Reliance Retail":
+{"entities": [{"id": "Reliance Industries Limited", "type": "Company", "metadata": "Parent company"},
+              {"id": "Jio", "type": "Company", "metadata": "Subsidiary"},
+              {"id": "Reliance Retail", "type": "Company", "metadata": "Subsidiary"}],
+ "relationships": [{"source": "Reliance Industries Limited", "target": "Jio", "relation": "OWNS"},
+                   {"source": "Reliance Industries Limited", "target": "Reliance Retail", "relation": "OWNS"}]}
+""".strip()
+
+# Cache namespaces - editing a prompt invalidates the extractions cached with it
+PROMPT_VERSION = hashlib.sha256(_EXTRACTION_PROMPT.encode('utf-8')).hexdigest()[:16]
+COMPACT_PROMPT_VERSION = hashlib.sha256(_EXTRACTION_PROMPT_COMPACT.encode('utf-8')).hexdigest()[:16]
+
+# Room taken by the "\n\n--- SEGMENT n ---\n" line in front of each chunk of a batched request
+_SEGMENT_HEADER_CHARS = 24
+
+# Person titles stripped from the start of names, each with the two separators it is recognised by
+_PERSON_TITLES = tuple((title + " ", title + ".") for title in
+                       ("shri", "shri.", "shree", "mr.", "mr", "mrs.", "mrs", "ms.", "ms",
+                        "dr.", "dr", "prof.", "prof", "sir", "madam", "smt.", "smt"))
+# Company suffixes, removed in this order (each starts with a space)
+_COMPANY_SUFFIXES = (" limited", " ltd", " ltd.", " industries", " industry", " corporation", " corp", " corp.",
+                     " incorporated", " inc", " inc.")
+# One str.translate pass: drop "." / ",", turn "-" / "_" into spaces
+_NAME_PUNCTUATION = str.maketrans({".": None, ",": None, "-": " ", "_": " "})
+
+# Entity filter: types that are usually not useful entities, and substrings marking an id as a date
+_INVALID_ENTITY_TYPES = frozenset(('Date', 'Event', 'Document'))
+_DATE_PATTERNS = ('fy ', 'cy', 'march', 'april', 'may', 'june', 'july', 'august',
+                  'september', 'october', 'november', 'december', 'january', 'february')
+_YEAR_PATTERNS = ('2024', '2025', '2026', '2023', '2022')
+
+# Relationship validation rules (see _validate_and_fix_relationships)
+_FINANCIAL_RELATIONS = frozenset(('HAS_REVENUE', 'HAS_PROFIT', 'HAS_ASSET', 'HAS_EQUITY', 'HAS_DEBT', 'HAS_EXPORTS',
+                                  'HAS_CSR_CONTRIBUTION'))
+# These cannot have financial relationships
+_INVALID_FINANCIAL_SOURCE_TYPES = frozenset(('Event', 'Date', 'Document', 'Metric'))
+# Financial relationships point at amounts - Person, Company, etc. cannot be one
+_INVALID_FINANCIAL_TARGET_TYPES = frozenset(('Person', 'Company', 'Event', 'Date', 'Document', 'Location', 'Risk',
+                                             'Product', 'Framework'))
+
+def _entity_filter_reason(entity):
+    """
+    Why an entity shouldn't be in a financial knowledge graph ("date entity", "Event entity", ...), or None to keep it.
+    A pure function of the entity, so a very large graph could be filtered in shards by a process pool.
+    """
+    entity_type = entity.get('type', 'default')
+    entity_id = str(entity.get('id') or entity.get('name') or '')
+    entity_id_lower = entity_id.lower()
+    
+    # Check if it's a date pattern (map runs the substring checks in C, no generator frame per pattern)
+    if any(map(entity_id_lower.__contains__, _DATE_PATTERNS)):
+        return "date entity"
+    # Short strings with years are likely dates
+    if len(entity_id_lower) < 20 and any(map(entity_id_lower.__contains__, _YEAR_PATTERNS)):
+        return "date entity"
+    
+    # Filter invalid types
+    if entity_type in _INVALID_ENTITY_TYPES:
+        return f"{entity_type} entity"
+    
+    # Filter percentages classified as Dollar Amount
+    if entity_type == 'Dollar Amount' and '%' in entity_id and len(entity_id) < 10:
+        return "percentage misclassified as Dollar Amount"
+    return None
+
+# Entity names repeat across chunks and dedup passes - both steps are memoized on the (hashable) name strings
+@lru_cache(maxsize=4096)
+def _normalize_entity_name(name):
+    """Normalize entity name for comparison - handles variations and abbreviations."""
+    if not name:
+        return ""
+
+    name = str(name).strip()
+    normalized = name.lower()
+
+    # Remove common person name prefixes and titles
+    for with_space, with_dot in _PERSON_TITLES:
+        if normalized.startswith(with_space):
+            normalized = normalized[len(with_space) - 1:].strip()
+        if normalized.startswith(with_dot):
+            normalized = normalized[len(with_dot):].strip()
+
+    # Remove common company suffixes and prefixes (single-word names can't contain one)
+    if " " in normalized:
+        for suffix in _COMPANY_SUFFIXES:
+            normalized = normalized.replace(suffix, "")
+
+    # Remove punctuation for better matching
+    normalized = normalized.translate(_NAME_PUNCTUATION)
+
+    # Remove extra whitespace
+    normalized = " ".join(normalized.split())
+
+    return normalized
+
+# A normalized name with the word sets the fuzzy match compares, built once per distinct name
+_NameKey = namedtuple('_NameKey', 'norm words core core_count')
+
+@lru_cache(maxsize=4096)
+def _name_key(norm):
+    """Build the _NameKey of a normalized entity name."""
+    words = norm.split()
+    # Single-letter words are likely middle initials like "d", "h"
+    core_words = [w for w in words if len(w) > 1]
+    return _NameKey(norm, frozenset(words), frozenset(core_words), len(core_words))
+
+def _name_keys_match(key1, key2):
+    """Check if two entity names (as _NameKeys) refer to the same entity (order matters for the core-word rule)."""
+    # Exact match
+    if key1.norm == key2.norm:
+        return True
+
+    # Cheap rejection: apart from the short-abbreviation rule below, every rule needs a shared word
+    if len(key1.norm) > 5 and len(key2.norm) > 5 and key1.words.isdisjoint(key2.words):
+        return False
+
+    # For person names, check if core name matches (ignoring middle initials and order)
+    # e.g., "mukesh d ambani" vs "mukesh ambani" vs "shri mukesh d ambani"
+    if key1.core_count >= 2 and key2.core_count >= 2:
+        if key1.core == key2.core:
+            return True
+        # Check if all core words from shorter name are in longer name
+        if key1.core_count <= key2.core_count:
+            if key1.core <= key2.core:
+                return True
+        elif key2.core <= key1.core:
+            return True
+
+    # If one name is subset of another (e.g., "ril" in "reliance industries limited")
+    if key1.words and key2.words:
+        if key1.words <= key2.words or key2.words <= key1.words:
+            return True
+
+    # Check for common abbreviations (e.g., "RIL" = "Reliance Industries Limited")
+    norm1, norm2 = key1.norm, key2.norm
+    if len(norm1) <= 5 and norm1 in norm2:
+        return True
+    if len(norm2) <= 5 and norm2 in norm1:
+        return True
+
+    return False
+
+class _NameIndex:
+    """
+    Entity name keys in insertion order, indexed by word, so a fuzzy lookup only compares the names that
+    can match: names sharing a word with it, plus short ones (the abbreviation rule needs no shared word).
+    """
+
+    def __init__(self):
+        self._keys = {}  # normalized name -> _NameKey, in insertion order
+        self._order = {}  # normalized name -> insertion number
+        self._by_word = defaultdict(set)
+        self._short = set()
+        self._inserted = 0
+
+    def add(self, name_key):
+        if name_key.norm in self._keys:
+            return
+        self._keys[name_key.norm] = name_key
+        self._order[name_key.norm] = self._inserted
+        self._inserted += 1
+        for word in name_key.words:
+            self._by_word[word].add(name_key.norm)
+        if len(name_key.norm) <= 5:
+            self._short.add(name_key.norm)
+
+    def remove(self, norm):
+        name_key = self._keys.pop(norm)
+        del self._order[norm]
+        for word in name_key.words:
+            self._by_word[word].discard(norm)
+        self._short.discard(norm)
+
+    def first_match(self, name_key):
+        """Normalized name of the earliest added key that _name_keys_match(name_key, key), or None."""
+        if len(name_key.norm) <= 5:
+            # A short name can be an abbreviation inside any other name - check them all in order
+            return next((norm for norm, other in self._keys.items() if _name_keys_match(name_key, other)), None)
+        
+        candidates = self._short.union(*(self._by_word[word] for word in name_key.words if word in self._by_word))
+        matches = [norm for norm in candidates if _name_keys_match(name_key, self._keys[norm])]
+        return min(matches, key=self._order.__getitem__) if matches else None
+
+# Keys the LLM has been seen to use for each relationship field (first one is the canonical key)
+_SOURCE_KEYS = ('source', 'entity1', 'from')
+_TARGET_KEYS = ('target', 'entity2', 'to')
+_RELATION_KEYS = ('relation', 'type', 'relationship')
+
+def _first_value(record, keys, default=''):
+    for key in keys:
+        value = record.get(key)
+        if value:
+            return value
+    return default
+
+def _normalize_rel_dict(rel):
+    """Return rel with its ends / relation under the canonical 'source' / 'target' / 'relation' keys."""
+    if rel.get('source') and rel.get('target') and rel.get('relation'):
+        return rel  # Already canonical (every validated response)
+    normalized = {key: value for key, value in rel.items()
+                  if key not in _SOURCE_KEYS and key not in _TARGET_KEYS and key not in _RELATION_KEYS}
+    normalized['source'] = _first_value(rel, _SOURCE_KEYS)
+    normalized['target'] = _first_value(rel, _TARGET_KEYS)
+    normalized['relation'] = _first_value(rel, _RELATION_KEYS, 'RELATED_TO')
+    return normalized
+
+class FinancialDetective:
+    
+    def __init__(self, cache_dir=None):
+        self.llm = LLMEngine()
+        # Optional on-disk cache of finished extractions (None = always call the LLM)
+        self.cache = ExtractionCache(cache_dir) if cache_dir else None
+        # In-process LRU of finished extractions (normalized-text hash -> graph), see Config.MEMORY_CACHE_SIZE
+        self._memory_cache = OrderedDict()
+        # The prompt is chosen once per instance, so the per-chunk hot path reads a plain attribute
+        if Config.COMPACT_PROMPT:
+            self._prompt, self._prompt_version = _EXTRACTION_PROMPT_COMPACT, COMPACT_PROMPT_VERSION
+        else:
+            self._prompt, self._prompt_version = _EXTRACTION_PROMPT, PROMPT_VERSION
+
+    def get_extraction_prompt(self):
+        """
+        Return the static extraction prompt (sent as the system message).
         """
+        return self._prompt
+
+    def get_prompt_version(self):
+        """
+        Return the cache namespace of the prompt in use.
+        """
+        return self._prompt_version
+
+    def get_existing_context(self, existing_entities=None):
+        """
+        Generate the note about already extracted entities that is sent ahead of the chunk text.
+        """
+        if not existing_entities:
+            return ""
+        
+        # Show first few entities to give context (without copying the whole set) - a fixed number of names,
+        # so the note costs the same prompt tokens on every chunk however many entities were extracted
+        sample_entities = list(islice(existing_entities, Config.EXISTING_CONTEXT_NAMES))
+        return f"""IMPORTANT - AVOID DUPLICATES:
+The following entities have already been extracted in previous chunks. DO NOT extract them again unless you find NEW information:
+{', '.join(sample_entities)}
+... and {len(existing_entities) - len(sample_entities)} more entities.
+
+Focus on extracting ONLY NEW entities and relationships that haven't been extracted yet."""
 
     def _chunk_text(self, text, chunk_size, overlap):
-        """Split text into chunks with overlap."""
-        chunks = []
+        """Split text into chunks with overlap (yielded one at a time, see _count_chunks for the number)."""
         start = 0
         text_length = len(text)
         
         while start < text_length:
             end = start + chunk_size
-            chunk = text[start:end]
-            chunks.append(chunk)
+            yield text[start:end]
             
             # Move start position forward by chunk_size - overlap
             start += chunk_size - overlap
-            
-            # Prevent infinite loop
-            if start >= text_length:
-                break
-        
-        return chunks
     
-    def _normalize_name(self, name):
-        """Normalize entity name for comparison - handles variations and abbreviations."""
-        if not name:
-            return ""
-        
-        name = str(name).strip()
-        normalized = name.lower()
-        
-        # Remove common person name prefixes and titles
-        person_titles = ["shri", "shri.", "shree", "mr.", "mr", "mrs.", "mrs", "ms.", "ms", 
-                        "dr.", "dr", "prof.", "prof", "sir", "madam", "smt.", "smt"]
-        for title in person_titles:
-            # Remove title at the begiremove the nning
-            if normalized.startswith(title + " "):
-                normalized = normalized[len(title):].strip()
-            if normalized.startswith(title + "."):
-                normalized = normalized[len(title) + 1:].strip()
-        
-        # Remove common company suffixes and prefixes
-        normalized = normalized.replace(" limited", "").replace(" ltd", "").replace(" ltd.", "")
-        normalized = normalized.replace(" industries", "").replace(" industry", "")
-        normalized = normalized.replace(" corporation", "").replace(" corp", "").replace(" corp.", "")
-        normalized = normalized.replace(" incorporated", "").replace(" inc", "").replace(" inc.", "")
-        
-        # Remove punctuation for better matching
-        normalized = normalized.replace(".", "").replace(",", "").replace("-", " ").replace("_", " ")
-        
-        # Remove extra whitespace
-        normalized = " ".join(normalized.split())
-        
-        return normalized
+    @staticmethod
+    def _count_chunks(text_length, chunk_size, overlap):
+        """Number of chunks _chunk_text yields for a text of text_length chars."""
+        step = chunk_size - overlap
+        return -(-text_length // step)  # ceil(text_length / step)
+    
+    # Name normalization is a pure function of the name, cached at module level (no self in the key)
+    _normalize_name = staticmethod(_normalize_entity_name)
     
-    def _is_same_entity(self, name1, name2):
+    @staticmethod
+    def _is_same_entity(name1, name2):
         """Check if two entity names refer to the same entity."""
-        norm1 = self._normalize_name(name1)
-        norm2 = self._normalize_name(name2)
-        
-        # Exact match
-        if norm1 == norm2:
-            return True
-        
-        # For person names, check if core name matches (ignoring middle initials)
-        # e.g., "mukesh d ambani" vs "mukesh ambani" vs "shri mukesh d ambani"
-        words1 = norm1.split()
-        words2 = norm2.split()
-        
-        # Remove single-letter words (likely middle initials like "d", "h")
-        core_words1 = [w for w in words1 if len(w) > 1]
-        core_words2 = [w for w in words2 if len(w) > 1]
-        
-        # If core words match (ignoring order), likely same person
-        if len(core_words1) >= 2 and len(core_words2) >= 2:
-            if set(core_words1) == set(core_words2):
-                return True
-            # Check if all core words from shorter name are in longer name
-            if len(core_words1) <= len(core_words2):
-                if all(word in core_words2 for word in core_words1):
-                    return True
-            else:
-                if all(word in core_words1 for word in core_words2):
-                    return True
-        
-        # Check if one is abbreviation of the other (for companies)
-        words1_set = set(norm1.split())
-        words2_set = set(norm2.split())
-        
-        # If one name is subset of another (e.g., "ril" in "reliance industries limited")
-        if words1_set and words2_set:
-            if words1_set.issubset(words2_set) or words2_set.issubset(words1_set):
-                return True
-        
-        # Check for common abbreviations (e.g., "RIL" = "Reliance Industries Limited")
-        if len(norm1) <= 5 and norm1 in norm2:
-            return True
-        if len(norm2) <= 5 and norm2 in norm1:
-            return True
-        
-        return False
+        return _name_keys_match(_name_key(_normalize_entity_name(name1)), _name_key(_normalize_entity_name(name2)))
     
     def _deduplicate_entities(self, entities):
         """Remove duplicate entities, keeping the one with best metadata."""
+        # normalized key name -> (key name, entity). Exact repeats (the common case across chunks) are one dict
+        # lookup, the fuzzy comparison only runs for new names, against the kept names that share a word
         entity_map = {}
+        name_index = _NameIndex()
+        # Hot loop: helpers bound to locals once instead of looked up per entity
+        normalize, name_key = self._normalize_name, _name_key
         
         for entity in entities:
-            if not isinstance(entity, dict):
-                continue
+            # Dicts with an id only (see _merge_chunk_results)
+            entity_id = entity.get('id') or entity.get('name')
             
-            entity_id = entity.get('id') or entity.get('name') or ''
-            if not entity_id:
+            # Check if this entity already exists (exact or similar)
+            key = normalize(entity_id)
+            existing_key = key if key in entity_map else name_index.first_match(name_key(key))
+            if existing_key is None:
+                entity_map[key] = (entity_id, entity)
+                name_index.add(name_key(key))
                 continue
             
-            # Check if this entity already exists (exact or similar)
-            found_duplicate = False
-            for existing_id, existing_entity in entity_map.items():
-                if self._is_same_entity(entity_id, existing_id):
-                    found_duplicate = True
-                    # Keep the one with better metadata or longer name (more complete)
-                    existing_metadata = str(existing_entity.get('metadata', '') or '')
-                    new_metadata = str(entity.get('metadata', '') or '')
-                    existing_name_len = len(str(existing_id))
-                    new_name_len = len(str(entity_id))
-                    
-                    # Prefer longer name (more complete) or better metadata
-                    if (new_name_len > existing_name_len) or (len(new_metadata) > len(existing_metadata) and new_metadata):
-                        entity_map[existing_id] = entity
-                        # Update key if name is more complete
-                        if new_name_len > existing_name_len:
-                            del entity_map[existing_id]
-                            entity_map[entity_id] = entity
-                    break
+            # Keep the one with better metadata or longer name (more complete)
+            existing_id, existing_entity = entity_map[existing_key]
+            existing_metadata = str(existing_entity.get('metadata', '') or '')
+            new_metadata = str(entity.get('metadata', '') or '')
+            existing_name_len = len(str(existing_id))
+            new_name_len = len(str(entity_id))
             
-            if not found_duplicate:
-                entity_map[entity_id] = entity
+            if new_name_len > existing_name_len:
+                # Update key if name is more complete
+                del entity_map[existing_key]
+                name_index.remove(existing_key)
+                entity_map[key] = (entity_id, entity)
+                name_index.add(name_key(key))
+            elif len(new_metadata) > len(existing_metadata) and new_metadata:
+                entity_map[existing_key] = (existing_id, entity)
         
-        return list(entity_map.values())
+        return [entity for _, entity in entity_map.values()]
     
     def _deduplicate_relationships(self, relationships, entity_map=None):
         """Remove duplicate relationships, using entity normalization."""
         if entity_map is None:
             entity_map = {}
         
+        # Hot loops: helpers bound to locals once instead of looked up per name
+        normalize, name_key, names_match = self._normalize_name, _name_key, _name_keys_match
+        
         # Create mapping: normalized_name -> canonical_name (best version)
         normalized_to_canonical = {}
         for orig_name in entity_map.keys():
-            norm = self._normalize_name(orig_name)
+            norm = normalize(orig_name)
             # Use the longest/most complete name as canonical
             if norm not in normalized_to_canonical:
                 normalized_to_canonical[norm] = orig_name
             elif len(orig_name) > len(normalized_to_canonical[norm]):
                 normalized_to_canonical[norm] = orig_name
         
+        # _is_same_entity only looks at normalized names, so each distinct endpoint is matched against the
+        # entities once (first match in entity order), not once per relationship
+        entity_index = _NameIndex()
+        for orig_name in entity_map.keys():
+            entity_index.add(name_key(normalize(orig_name)))
+        entity_matches = {}
+        
+        def first_matching_entity(key):
+            if key.norm not in entity_matches:
+                entity_matches[key.norm] = entity_index.first_match(key)
+            return entity_matches[key.norm]
+        
         relationship_set = set()
-        unique_relationships = []
+        # Kept relationships by input position (a replaced one is dropped in O(1)), and per relation type
+        # the (position, source, target, source name key, target name key) of each, for the duplicate check
+        unique_relationships = {}
+        relationships_by_type = {}
         
-        for rel in relationships:
-            if not isinstance(rel, dict):
-                continue
-            
-            source = rel.get('source') or rel.get('entity1') or rel.get('from') or ''
-            target = rel.get('target') or rel.get('entity2') or rel.get('to') or ''
-            relation = rel.get('relation') or rel.get('type') or rel.get('relationship') or 'RELATED_TO'
-            
-            if not source or not target:
-                continue
+        for position, rel in enumerate(relationships):
+            # Relationships arrive with canonical keys and both ends set (see _merge_chunk_results)
+            source, target, relation = rel['source'], rel['target'], rel['relation']
             
             # Normalize source and target names
-            normalized_source = self._normalize_name(source)
-            normalized_target = self._normalize_name(target)
+            source_key = name_key(normalize(source))
+            target_key = name_key(normalize(target))
             normalized_relation = relation.strip().upper()
             
-            # Find canonical names by checking if source/target match any entity
-            canonical_source = source
-            canonical_target = target
+            # Find canonical names by checking if source/target match any entity (fuzzy matching)
+            canonical_source, normalized_source = source, source_key.norm
+            canonical_target, normalized_target = target, target_key.norm
             
-            # Check if source matches any existing entity (using _is_same_entity for fuzzy matching)
-            for orig_name in entity_map.keys():
-                if self._is_same_entity(source, orig_name):
-                    norm = self._normalize_name(orig_name)
-                    canonical_source = normalized_to_canonical.get(norm, orig_name)
-                    normalized_source = norm
-                    break
+            norm = first_matching_entity(source_key)
+            if norm is not None:
+                canonical_source, normalized_source = normalized_to_canonical[norm], norm
             
-            # Check if target matches any existing entity
-            for orig_name in entity_map.keys():
-                if self._is_same_entity(target, orig_name):
-                    norm = self._normalize_name(orig_name)
-                    canonical_target = normalized_to_canonical.get(norm, orig_name)
-                    normalized_target = norm
-                    break
+            norm = first_matching_entity(target_key)
+            if norm is not None:
+                canonical_target, normalized_target = normalized_to_canonical[norm], norm
             
-            # Also check relationships against each other for duplicates
+            # Also check relationships of the same type against each other for duplicates
             # (e.g., "Shri Dhirubhai Ambani" vs "Shri. Dhirubhai H. Ambani")
             is_duplicate = False
-            for existing_rel in unique_relationships:
-                existing_source = existing_rel.get('source') or existing_rel.get('entity1') or existing_rel.get('from') or ''
-                existing_target = existing_rel.get('target') or existing_rel.get('entity2') or existing_rel.get('to') or ''
-                existing_relation = existing_rel.get('relation') or existing_rel.get('type') or existing_rel.get('relationship') or ''
+            same_type = relationships_by_type.get(normalized_relation, [])
+            for entry in same_type:
+                existing_position, existing_source, existing_target, existing_source_key, existing_target_key = entry
                 
-                if (normalized_relation == existing_relation.strip().upper() and
-                    self._is_same_entity(source, existing_source) and
-                    self._is_same_entity(target, existing_target)):
+                if (names_match(source_key, existing_source_key) and
+                    names_match(target_key, existing_target_key)):
                     is_duplicate = True
                     # Keep the one with more complete names (longer)
                     if (len(source) > len(existing_source) or len(target) > len(existing_target)):
                         # Replace the existing one
-                        unique_relationships.remove(existing_rel)
-                        relationship_set.discard((self._normalize_name(existing_source), 
-                                                 self._normalize_name(existing_target), 
-                                                 normalized_relation))
+                        del unique_relationships[existing_position]
+                        same_type.remove(entry)
+                        relationship_set.discard((existing_source_key.norm, existing_target_key.norm, normalized_relation))
                         is_duplicate = False  # Allow adding the better version
                     break
             
@@ -375,89 +555,203 @@ class FinancialDetective:
                 rel_key = (normalized_source, normalized_target, normalized_relation)
                 if rel_key not in relationship_set:
                     relationship_set.add(rel_key)
-                    # Use canonical names in the relationship
-                    rel_copy = rel.copy()
-                    rel_copy['source'] = canonical_source
-                    rel_copy['target'] = canonical_target
-                    unique_relationships.append(rel_copy)
+                    # Use canonical names in the relationship (the merged graph owns these dicts, no copy needed)
+                    rel['source'] = canonical_source
+                    rel['target'] = canonical_target
+                    unique_relationships[position] = rel
+                    relationships_by_type.setdefault(normalized_relation, []).append(
+                        (position, canonical_source, canonical_target,
+                         name_key(normalized_source), name_key(normalized_target)))
         
-        return unique_relationships
+        return list(unique_relationships.values())
 
-    def analyze(self, raw_text):
+    def analyze(self, raw_text, chunks=None):
         """
         Analyze text by chunking it if too long, then merge results.
+        Pre-computed chunks (e.g. from TextTokenizer) can be passed in to skip re-chunking.
+        Results are served from / stored in the extraction cache when one is configured.
+        """
+        cache_key, cached = self._lookup_cache(raw_text)
+        if cached is not None:
+            return cached
+        
+        result = self._analyze_text(raw_text, chunks)
+        self._store_cache(cache_key, result)
+        return result
+    
+    async def analyze_async(self, raw_text, chunks=None):
+        """
+        Async version of analyze() for callers that already run an event loop.
+        All chunks are sent with asyncio.gather, at most Config.LLM_MAX_CONCURRENCY at a time.
+        """
+        semaphore = asyncio.Semaphore(max(1, Config.LLM_MAX_CONCURRENCY))
+        return await self._analyze_async(raw_text, chunks, semaphore)
+    
+    async def analyze_many(self, texts, max_in_flight=None):
+        """
+        Analyze several documents concurrently. Returns one graph per text, in order.
+        All documents share one limit on in-flight LLM requests (default Config.LLM_MAX_CONCURRENCY),
+        so a short document's request doesn't wait for a long document to finish.
+        A document whose extraction fails gets an empty graph instead of discarding the finished ones.
+        """
+        max_in_flight = max(1, max_in_flight or Config.LLM_MAX_CONCURRENCY)
+        semaphore = asyncio.Semaphore(max_in_flight)
+        logger.info(f"Analyzing {len(texts)} documents with up to {max_in_flight} concurrent LLM requests...")
+        results = await asyncio.gather(*(self._analyze_async(text, None, semaphore) for text in texts),
+                                       return_exceptions=True)
+        
+        graphs = []
+        for i, result in enumerate(results):
+            if isinstance(result, BaseException):
+                if isinstance(result, asyncio.CancelledError):
+                    raise result
+                logger.error(f"Document {i + 1}/{len(texts)} failed: {result}, returning an empty graph")
+                result = {"entities": [], "relationships": []}
+            graphs.append(result)
+        return graphs
+    
+    async def _analyze_async(self, raw_text, chunks, semaphore):
+        """analyze_async with the semaphore bounding in-flight LLM requests passed in."""
+        cache_key, cached = self._lookup_cache(raw_text)
+        if cached is not None:
+            return cached
+        
+        if len(raw_text) <= Config.CHUNK_SIZE:
+            logger.info(f"Text length ({len(raw_text)} chars) is manageable, processing directly")
+            async with semaphore:
+                result = await self._process_single_chunk_async(raw_text)
+        else:
+            chunks, total = self._prepare_chunks(raw_text, chunks)
+            batch_results = await asyncio.gather(*(
+                self._process_batch_with_retry_async(batch, total, semaphore)
+                for batch in self._group_chunks(chunks)
+            ))
+            final_graph = self._merge_chunk_results([r for results in batch_results for r in results if r is not None],
+                                                     by_normalized_name=True)
+            result = self._finalize_graph(final_graph)
+        
+        self._store_cache(cache_key, result)
+        return result
+    
+    def _lookup_cache(self, raw_text):
         """
+        Return (cache_key, cached_result); cached_result is None on a miss.
+        Checks the in-memory LRU first, then the on-disk cache when one is configured.
+        """
+        # Keyed on whitespace-normalized text, so re-extracted copies that only differ in spacing / line breaks
+        # (different PDF flags, CLEAN_TEXT on or off) share one entry
+        normalized_text = " ".join(raw_text.split())
+        memory_key = None
+        if Config.MEMORY_CACHE_SIZE > 0:
+            # blake2b is cheaper than sha256 and plenty for an in-process key
+            memory_key = (Config.LLM_MODEL_NAME,
+                          hashlib.blake2b(normalized_text.encode('utf-8'), digest_size=16).digest())
+            cached = self._memory_cache.get(memory_key)
+            if cached is not None:
+                self._memory_cache.move_to_end(memory_key)
+                logger.info(f"In-memory cache hit ({len(cached['entities'])} entities, {len(cached['relationships'])} relationships), skipping LLM")
+                return (memory_key, None), self._copy_graph(cached)
+        
+        disk_key = None
+        if self.cache is not None:
+            disk_key = (self._prompt_version, ExtractionCache.make_key(Config.LLM_MODEL_NAME, normalized_text))
+            cached = self.cache.get(disk_key)
+            if cached is not None:
+                logger.info(f"Extraction cache hit ({len(cached['entities'])} entities, {len(cached['relationships'])} relationships), skipping LLM")
+                self._remember(memory_key, cached)
+                return (memory_key, disk_key), cached
+        return (memory_key, disk_key), None
+    
+    def _store_cache(self, cache_key, result):
+        # An empty graph usually means every LLM call failed - don't pin that in the cache
+        if not result.get('entities'):
+            return
+        memory_key, disk_key = cache_key
+        self._remember(memory_key, result)
+        if disk_key is not None:
+            self.cache.put(disk_key, result)
+    
+    def _remember(self, memory_key, result):
+        # Store a private copy (callers may modify the graph they get back), evicting the least recently used
+        if memory_key is None:
+            return
+        self._memory_cache[memory_key] = self._copy_graph(result)
+        self._memory_cache.move_to_end(memory_key)
+        while len(self._memory_cache) > Config.MEMORY_CACHE_SIZE:
+            self._memory_cache.popitem(last=False)
+    
+    @staticmethod
+    def _copy_graph(graph):
+        return {"entities": [dict(entity) for entity in graph['entities']],
+                "relationships": [dict(rel) for rel in graph['relationships']]}
+    
+    def _analyze_text(self, raw_text, chunks=None):
+        """Run the LLM extraction for raw_text (no caching)."""
         # Determine if we need to chunk
-        max_text_length = 10000  # Maximum characters to send at once
-        chunk_size = Config.CHUNK_SIZE
-        overlap = Config.CHUNK_OVERLAP
+        max_text_length = Config.CHUNK_SIZE  # Maximum characters to send at once
         
         # If text is short enough, process entire text directly
         if len(raw_text) <= max_text_length:
             logger.info(f"Text length ({len(raw_text)} chars) is manageable, processing directly")
             return self._process_single_chunk(raw_text)
         
-        # Text is too long, need to chunk the text to small chunks
-        logger.info(f"Text length ({len(raw_text)} chars) exceeds limit ({max_text_length}), chunking...")
-        chunks = self._chunk_text(raw_text, chunk_size, overlap)
-        logger.info(f"Split text into {len(chunks)} chunks")
+        chunks, total = self._prepare_chunks(raw_text, chunks)
         
-        # The graph to store the entities and relationships
-        final_graph = {"entities": [], "relationships": []}
+        max_concurrency = max(1, min(Config.LLM_MAX_CONCURRENCY, total))
+        if max_concurrency > 1:
+            # Chunks are independent LLM round-trips - send them concurrently and merge in chunk order.
+            # (The "already extracted" prompt context needs sequential processing, the final dedup pass covers it)
+            logger.info(f"Processing {total} chunks with up to {max_concurrency} concurrent LLM requests...")
+            chunk_results = []
+            batches = list(self._group_chunks(chunks))
+            with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+                futures = [executor.submit(self._process_batch_with_retry, batch, total) for batch in batches]
+                for batch, future in zip(batches, futures):
+                    for (i, _), chunk_result in zip(batch, future.result()):
+                        if chunk_result is None:
+                            continue
+                        chunk_results.append(chunk_result)
+                        logger.info(f"Chunk {i + 1} success: +{len(chunk_result.get('entities', []))} entities, +{len(chunk_result.get('relationships', []))} relationships")
+            final_graph = self._merge_chunk_results(chunk_results, by_normalized_name=True)
+        else:
+            final_graph = self._analyze_chunks_sequentially(chunks, total)
         
-        # Process each chunk with incremental deduplication to avoid duplicates of the entities and relationships already extracted
-        for i, chunk in enumerate(chunks):
-            logger.info(f"Processing chunk {i + 1}/{len(chunks)} ({len(chunk)} chars)...")
-            
-            # Retry logic for each chunk if json parse error or any other error occurs
-            for attempt in range(2):
-                try:
-                    # Get already extracted entities to avoid duplicates of the entities already extracted else null will set
-                    existing_entity_names = {self._normalize_name(e.get('id') or e.get('name') or '') 
-                                           for e in final_graph["entities"] if isinstance(e, dict)}
-                    
-                    # process the single chunk to the LLM and get the result
-                    chunk_result = self._process_single_chunk(chunk, existing_entities=existing_entity_names)
-                    
-                    # Merge results to the final graph 
-                    if "entities" in chunk_result:
-                        final_graph["entities"].extend(chunk_result["entities"])
-                    if "relationships" in chunk_result:
-                        final_graph["relationships"].extend(chunk_result["relationships"])
-                    
-                    # Incremental deduplication after each chunk to avoid duplicates of the entities and relationships already extracted
-                    final_graph["entities"] = self._deduplicate_entities(final_graph["entities"])
-                    # Create entity map for relationship deduplication to avoid duplicates of the relationships already extracted
-                    entity_map = {}
-                    for e in final_graph["entities"]:
-                        if isinstance(e, dict):
-                            entity_id = e.get('id') or e.get('name') or ''
-                            if entity_id:
-                                entity_map[entity_id] = e
-                    
-                    # Deduplicate relationships to avoid duplicates of the relationships already extracted
-                    final_graph["relationships"] = self._deduplicate_relationships(final_graph["relationships"], entity_map)
-                    
-                    logger.info(f"Chunk {i + 1} success: +{len(chunk_result.get('entities', []))} entities, +{len(chunk_result.get('relationships', []))} relationships")
-                    logger.info(f"After dedup: {len(final_graph['entities'])} unique entities, {len(final_graph['relationships'])} unique relationships")
-                    break  # Success, move to next chunk
-                    
-                except json.JSONDecodeError as e:
-                    if attempt < 1:
-                        logger.warning(f"Chunk {i + 1} JSON parse failed (attempt {attempt+1}), retrying...")
-                        time.sleep(1)
-                    else:
-                        logger.error(f"Chunk {i + 1} JSON parse failed after 2 attempts, skipping chunk")
-                        break
-                except Exception as e:
-                    if attempt < 1:
-                        logger.warning(f"Chunk {i + 1} error (attempt {attempt+1}): {e}, retrying...")
-                        time.sleep(1)
-                    else:
-                        logger.error(f"Chunk {i + 1} error after 2 attempts: {e}, skipping chunk")
-                        break
+        return self._finalize_graph(final_graph)
+    
+    def _prepare_chunks(self, raw_text, chunks=None):
+        """
+        Chunk text that is too long to send at once (unless chunks were passed in).
+        Returns (chunks, number of chunks) - chunks cut here are produced lazily, as they are consumed.
+        """
+        # Text is too long, need to chunk the text to small chunks
+        logger.info(f"Text length ({len(raw_text)} chars) exceeds limit ({Config.CHUNK_SIZE}), chunking...")
+        if chunks:
+            chunks = self._fit_chunks_to_context(chunks)
+            total = len(chunks)
+        else:
+            chunks = self._chunk_text(raw_text, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
+            total = self._count_chunks(len(raw_text), Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
+        logger.info(f"Split text into {total} chunks")
+        return chunks, total
+    
+    def _fit_chunks_to_context(self, chunks):
+        """Split chunks longer than one request allows (e.g. a huge 'sentence' from the tokenizer) instead of truncating them."""
+        max_chars = Config.MAX_CONTEXT_CHARS
+        if all(len(chunk) <= max_chars for chunk in chunks):
+            return chunks
         
-        # Final deduplication pass (in case incremental dedup missed anything)
+        fitted = []
+        for chunk in chunks:
+            if len(chunk) <= max_chars:
+                fitted.append(chunk)
+            else:
+                logger.info(f"Chunk of {len(chunk)} chars (~{len(chunk) // Config.CHARS_PER_TOKEN} tokens) exceeds the request budget, splitting it")
+                fitted.extend(self._chunk_text(chunk, max_chars, min(Config.CHUNK_OVERLAP, max_chars // 2)))
+        return fitted
+    
+    def _finalize_graph(self, final_graph):
+        """Filter, deduplicate and validate the merged chunk results."""
+        # Single deduplication pass over the results of all chunks
         logger.info(f"Final deduplication pass: {len(final_graph['entities'])} entities, {len(final_graph['relationships'])} relationships")
         
         # Filter out invalid entity types (dates, events, documents that shouldn't be in financial graph)
@@ -467,12 +761,7 @@ class FinancialDetective:
         final_graph['entities'] = self._deduplicate_entities(final_graph['entities'])
         
         # Create entity map for relationship deduplication to avoid duplicates of the relationships already extracted
-        entity_map = {}
-        for e in final_graph['entities']:
-            if isinstance(e, dict):
-                entity_id = e.get('id') or e.get('name') or ''
-                if entity_id:
-                    entity_map[entity_id] = e
+        entity_map = {e.get('id') or e.get('name'): e for e in final_graph['entities']}
         final_graph['relationships'] = self._deduplicate_relationships(final_graph['relationships'], entity_map)
         
         # Validate and fix relationship directions
@@ -482,52 +771,221 @@ class FinancialDetective:
         
         return final_graph
     
+    def _merge_chunk_results(self, chunk_results, by_normalized_name=False):
+        """
+        Merge chunk results, dropping exact repeats and id-less records so the fuzzy dedup pass has less to compare.
+        Every LLM answer goes through here, so the passes after it can rely on the shape: entities are dicts
+        with an id, relationships dicts with canonical keys and both ends set.
+        With by_normalized_name (chunked documents, which get the full dedup afterwards) entities are keyed by
+        normalized name and repeats resolved with the dedup's tie-break, so the fuzzy pass sees each name once.
+        """
+        merged = {"entities": [], "relationships": []}
+        seen_entities = {}  # entity key -> (index in merged["entities"], name kept for the length tie-break)
+        seen_relationships = set()
+        normalize = self._normalize_name if by_normalized_name else None
+        
+        for chunk_result in chunk_results:
+            for entity in chunk_result.get("entities") or []:
+                if not isinstance(entity, dict):
+                    continue
+                entity_id = entity.get('id') or entity.get('name') or ''
+                if not entity_id:
+                    continue
+                entity_key = normalize(entity_id) if normalize else entity_id
+                seen = seen_entities.get(entity_key)
+                if seen is None:
+                    seen_entities[entity_key] = (len(merged["entities"]), entity_id)
+                    merged["entities"].append(entity)
+                    continue
+                # Seen before - keep the one with better metadata (by name: the longer name first, as the dedup does)
+                index, existing_id = seen
+                existing_metadata = str(merged["entities"][index].get('metadata', '') or '')
+                new_metadata = str(entity.get('metadata', '') or '')
+                if normalize and len(str(entity_id)) > len(str(existing_id)):
+                    # The dedup re-inserts the more complete name, so it moves to the end here too
+                    del seen_entities[entity_key]
+                    merged["entities"][index] = None
+                    seen_entities[entity_key] = (len(merged["entities"]), entity_id)
+                    merged["entities"].append(entity)
+                elif len(new_metadata) > len(existing_metadata):
+                    merged["entities"][index] = entity
+            
+            for rel in chunk_result.get("relationships") or []:
+                if not isinstance(rel, dict):
+                    continue
+                # Canonical keys from here on, so the dedup / validation passes read rel['source'] etc. directly
+                rel = _normalize_rel_dict(rel)
+                rel_key = (rel['source'], rel['target'], rel['relation'])
+                # Relationships without both ends can't become an edge
+                if rel_key[0] and rel_key[1] and rel_key not in seen_relationships:
+                    seen_relationships.add(rel_key)
+                    merged["relationships"].append(rel)
+        
+        if normalize:
+            merged["entities"] = [entity for entity in merged["entities"] if entity is not None]
+        return merged
+    
+    def _group_chunks(self, chunks):
+        """
+        Group consecutive chunks into batches of up to Config.CHUNKS_PER_LLM_CALL that fit one request.
+        Yields lists of (chunk index, chunk) pairs, as the chunks are consumed.
+        """
+        per_call = max(1, Config.CHUNKS_PER_LLM_CALL)
+        batch = []
+        batch_chars = 0
+        for i, chunk in enumerate(chunks):
+            chunk_chars = len(chunk) + _SEGMENT_HEADER_CHARS
+            if batch and (len(batch) >= per_call or batch_chars + chunk_chars > Config.MAX_CONTEXT_CHARS):
+                yield batch
+                batch = []
+                batch_chars = 0
+            batch.append((i, chunk))
+            batch_chars += chunk_chars
+        if batch:
+            yield batch
+    
+    def _process_batch_with_retry(self, batch, total, existing_entities=None):
+        """
+        Process a batch of (index, chunk) pairs with one LLM call. Returns one result (None if skipped) per chunk.
+        Falls back to one call per chunk if the batched answer can't be split into valid per-chunk graphs.
+        """
+        if len(batch) > 1:
+            logger.info(f"Processing chunks {batch[0][0] + 1}-{batch[-1][0] + 1}/{total} in one LLM call...")
+            try:
+                raw_response = self._request_extraction(self._prompt, self._batch_text(batch),
+                                                        self._batch_context(len(batch), existing_entities), [])
+                chunk_results = self._split_batch_response(raw_response, len(batch))
+            except Exception as e:
+                logger.warning(f"Batched LLM call failed: {e}")
+                chunk_results = None
+            if chunk_results is not None:
+                return chunk_results
+            logger.warning(f"Falling back to one LLM call per chunk for chunks {batch[0][0] + 1}-{batch[-1][0] + 1}")
+        return [self._process_chunk_with_retry(i, total, chunk, existing_entities=existing_entities)
+                for i, chunk in batch]
+    
+    async def _process_batch_with_retry_async(self, batch, total, semaphore):
+        """Async version of _process_batch_with_retry, holding the semaphore while the request is in flight."""
+        if len(batch) > 1:
+            chunk_results = None
+            async with semaphore:
+                logger.info(f"Processing chunks {batch[0][0] + 1}-{batch[-1][0] + 1}/{total} in one LLM call...")
+                try:
+                    raw_response = await self.llm.generate_extraction_async(
+                        self._prompt, self._batch_text(batch), existing_context=self._batch_context(len(batch)))
+                    chunk_results = self._split_batch_response(raw_response, len(batch))
+                except Exception as e:
+                    logger.warning(f"Batched LLM call failed: {e}")
+            if chunk_results is not None:
+                return chunk_results
+            logger.warning(f"Falling back to one LLM call per chunk for chunks {batch[0][0] + 1}-{batch[-1][0] + 1}")
+        return await asyncio.gather(*(self._process_chunk_with_retry_async(i, total, chunk, semaphore)
+                                      for i, chunk in batch))
+    
+    @staticmethod
+    def _batch_text(batch):
+        return "\n\n".join(f"--- SEGMENT {n} ---\n{chunk}" for n, (_, chunk) in enumerate(batch, 1))
+    
+    def _batch_context(self, segment_count, existing_entities=None):
+        """Instructions for a batched request (answer shape), ahead of the existing-entity note if there is one."""
+        batch_note = f"""The text below contains {segment_count} segments, each starting with a "--- SEGMENT n ---" line.
+Extract each segment on its own and respond with ONE JSON object: {{"results": [<segment 1 graph>, ..., <segment {segment_count} graph>]}}
+- exactly {segment_count} graphs, in segment order, each an object with "entities" and "relationships" as described above."""
+        existing_context = self.get_existing_context(existing_entities)
+        return f"{batch_note}\n\n{existing_context}" if existing_context else batch_note
+    
+    def _split_batch_response(self, raw_response, segment_count):
+        """Split a batched answer into one graph per chunk. Returns None if it isn't exactly segment_count valid graphs."""
+        data = extract_json_object(raw_response)
+        results = data.get("results") if isinstance(data, dict) else None
+        if not isinstance(results, list) or len(results) != segment_count:
+            logger.warning(f"Batched LLM answer has no list of {segment_count} results")
+            return None
+        
+        chunk_results = []
+        for n, result in enumerate(results, 1):
+            graph, error = validate_extraction(result)
+            if graph is None:
+                logger.warning(f"Batched LLM answer, segment {n} failed validation: {error}")
+                return None
+            chunk_results.append(self._merge_chunk_results([graph]))
+        return chunk_results
+    
+    def _process_chunk_with_retry(self, i, total, chunk, existing_entities=None):
+        """Process one chunk, retrying once on failure. Returns None if the chunk has to be skipped."""
+        logger.info(f"Processing chunk {i + 1}/{total} ({len(chunk)} chars)...")
+        
+        # Invalid answers are already re-requested with feedback (and salvaged) inside _process_single_chunk,
+        # so only a lost connection / timeout is worth one more attempt here
+        for attempt in range(2):
+            try:
+                return self._process_single_chunk(chunk, existing_entities=existing_entities, cache_chunk=True)
+            except APIConnectionError as e:
+                if attempt < 1:
+                    logger.warning(f"Chunk {i + 1} connection error (attempt {attempt+1}): {e}, retrying...")
+                    time.sleep(1)
+                else:
+                    logger.error(f"Chunk {i + 1} connection error after 2 attempts: {e}, skipping chunk")
+            except Exception as e:
+                logger.error(f"Chunk {i + 1} error: {e}, skipping chunk")
+                return None
+        return None
+    
+    async def _process_chunk_with_retry_async(self, i, total, chunk, semaphore):
+        """Async version of _process_chunk_with_retry, holding the semaphore while the request is in flight."""
+        async with semaphore:
+            logger.info(f"Processing chunk {i + 1}/{total} ({len(chunk)} chars)...")
+            
+            for attempt in range(2):
+                try:
+                    chunk_result = await self._process_single_chunk_async(chunk, cache_chunk=True)
+                    logger.info(f"Chunk {i + 1} success: +{len(chunk_result.get('entities', []))} entities, +{len(chunk_result.get('relationships', []))} relationships")
+                    return chunk_result
+                except APIConnectionError as e:
+                    if attempt < 1:
+                        logger.warning(f"Chunk {i + 1} connection error (attempt {attempt+1}): {e}, retrying...")
+                        await asyncio.sleep(1)
+                    else:
+                        logger.error(f"Chunk {i + 1} connection error after 2 attempts: {e}, skipping chunk")
+                except Exception as e:
+                    logger.error(f"Chunk {i + 1} error: {e}, skipping chunk")
+                    return None
+        return None
+    
+    def _analyze_chunks_sequentially(self, chunks, total):
+        """Process chunks one by one, telling the LLM which entities were already extracted."""
+        # Chunk results are only collected here - the fuzzy dedup runs once over all of them in _finalize_graph
+        chunk_results = []
+        # Normalized names of the entities extracted so far, grown per chunk (sent to the LLM to avoid duplicates)
+        existing_entity_names = set()
+        for batch in self._group_chunks(chunks):
+            # process the chunk(s) of this batch with the LLM and get one result per chunk
+            batch_results = self._process_batch_with_retry(batch, total, existing_entities=existing_entity_names)
+            for (i, _), chunk_result in zip(batch, batch_results):
+                if chunk_result is None:
+                    continue
+                
+                chunk_results.append(chunk_result)
+                existing_entity_names.update(self._normalize_name(e.get('id') or e.get('name'))
+                                             for e in chunk_result["entities"])
+                
+                logger.info(f"Chunk {i + 1} success: +{len(chunk_result.get('entities', []))} entities, +{len(chunk_result.get('relationships', []))} relationships")
+                logger.info(f"So far: {len(existing_entity_names)} distinct entity names")
+        
+        return self._merge_chunk_results(chunk_results, by_normalized_name=True)
+    
     def _filter_invalid_entities(self, entities):
         """Filter out entities that shouldn't be in a financial knowledge graph."""
-        invalid_types = ['Date', 'Event', 'Document']  # These are usually not useful entities
         valid_entities = []
         removed_count = 0
         
-        # Date patterns to detect
-        date_patterns = ['fy ', 'cy', 'march', 'april', 'may', 'june', 'july', 'august', 
-                        'september', 'october', 'november', 'december', 'january', 'february']
-        year_patterns = ['2024', '2025', '2026', '2023', '2022']
-        
         for entity in entities:
-            if not isinstance(entity, dict):
+            reason = _entity_filter_reason(entity)
+            if reason is None:
+                valid_entities.append(entity)
                 continue
-            
-            entity_type = entity.get('type', 'default')
-            entity_id = str(entity.get('id') or entity.get('name') or '').lower()
-            
-            # Check if it's a date pattern
-            is_date = False
-            if any(pattern in entity_id for pattern in date_patterns):
-                is_date = True
-            elif any(year in entity_id for year in year_patterns) and len(entity_id) < 20:
-                # Short strings with years are likely dates
-                is_date = True
-            
-            if is_date:
-                logger.debug(f"Filtering out date entity: {entity.get('id') or entity.get('name')}")
-                removed_count += 1
-                continue
-            
-            # Filter invalid types
-            if entity_type in invalid_types:
-                logger.debug(f"Filtering out {entity_type} entity: {entity.get('id') or entity.get('name')}")
-                removed_count += 1
-                continue
-            
-            # Filter percentages classified as Dollar Amount
-            if entity_type == 'Dollar Amount':
-                entity_id_str = str(entity.get('id') or entity.get('name') or '')
-                if '%' in entity_id_str and len(entity_id_str) < 10:
-                    logger.debug(f"Filtering out percentage misclassified as Dollar Amount: {entity_id_str}")
-                    removed_count += 1
-                    continue
-            
-            valid_entities.append(entity)
+            logger.debug("Filtering out %s: %s", reason, entity.get('id') or entity.get('name'))
+            removed_count += 1
         
         if removed_count > 0:
             logger.info(f"Filtered out {removed_count} invalid entities (dates, events, documents, percentages)")
@@ -540,83 +998,85 @@ class FinancialDetective:
         - Fix reversed financial relationships (Dollar Amount -> HAS_REVENUE -> Company should be Company -> HAS_REVENUE -> Dollar Amount)
         - Remove invalid relationships (Events/Dates having financial relationships)
         """
-        financial_relations = ['HAS_REVENUE', 'HAS_PROFIT', 'HAS_ASSET', 'HAS_EQUITY', 'HAS_DEBT', 'HAS_EXPORTS', 'HAS_CSR_CONTRIBUTION']
-        invalid_source_types = ['Event', 'Date', 'Document', 'Metric']  # These cannot have financial relationships
+        # Entity types looked up once per endpoint: by raw id, and by normalized name for endpoints spelled
+        # differently from the entity (e.g. "Shri Mukesh D. Ambani" for "Mukesh D. Ambani")
+        normalize = self._normalize_name
+        type_by_id = {}
+        type_by_norm = {}
+        for entity_id, entity in entity_map.items():
+            entity_type = entity.get('type', 'default')
+            type_by_id[entity_id] = entity_type
+            type_by_norm.setdefault(normalize(entity_id), entity_type)
         
         valid_relationships = []
         fixed_count = 0
         removed_count = 0
         
         for rel in relationships:
-            if not isinstance(rel, dict):
-                continue
+            # Canonical keys, both ends set (see _merge_chunk_results)
+            source, target, relation = rel['source'], rel['target'], rel['relation']
             
-            source = rel.get('source') or rel.get('entity1') or rel.get('from') or ''
-            target = rel.get('target') or rel.get('entity2') or rel.get('to') or ''
-            relation = rel.get('relation') or rel.get('type') or rel.get('relationship') or 'RELATED_TO'
-            
-            if not source or not target:
-                removed_count += 1
-                continue
-            
-            # Get entity types
-            source_entity = entity_map.get(source, {})
-            target_entity = entity_map.get(target, {})
-            source_type = source_entity.get('type', 'default') if isinstance(source_entity, dict) else 'default'
-            target_type = target_entity.get('type', 'default') if isinstance(target_entity, dict) else 'default'
+            # Get entity types (exact id first, then any spelling variant of it)
+            source_type = type_by_id.get(source) or type_by_norm.get(normalize(source), 'default')
+            target_type = type_by_id.get(target) or type_by_norm.get(normalize(target), 'default')
             
             relation_upper = relation.strip().upper()
             
             # Check if financial relationship is reversed
-            if relation_upper in financial_relations:
+            if relation_upper in _FINANCIAL_RELATIONS:
                 # Financial relationships should be: Company -> relation -> Dollar Amount
                 # NEVER: Company -> HAS_REVENUE -> Person (WRONG!)
                 # NEVER: Company -> HAS_PROFIT -> Person (WRONG!)
                 
                 # Check for invalid target types (Person, Company, etc. cannot be financial amounts)
-                invalid_target_types = ['Person', 'Company', 'Event', 'Date', 'Document', 'Location', 'Risk', 'Product', 'Framework']
-                if target_type in invalid_target_types:
-                    logger.warning(f"Removing invalid financial relationship: {source} ({source_type}) -> {relation} -> {target} ({target_type}) (target must be Dollar Amount or Metric, not {target_type})")
+                if target_type in _INVALID_FINANCIAL_TARGET_TYPES:
+                    logger.warning("Removing invalid financial relationship: %s (%s) -> %s -> %s (%s) (target must be Dollar Amount or Metric, not %s)",
+                                   source, source_type, relation, target, target_type, target_type)
                     removed_count += 1
                     continue
                 
                 # If reversed, fix it
                 if target_type == 'Company' and source_type == 'Dollar Amount':
                     # Reversed! Fix it
-                    logger.warning(f"Fixing reversed relationship: {source} -> {relation} -> {target} (should be {target} -> {relation} -> {source})")
+                    logger.warning("Fixing reversed relationship: %s -> %s -> %s (should be %s -> %s -> %s)",
+                                   source, relation, target, target, relation, source)
                     rel['source'] = target
                     rel['target'] = source
                     fixed_count += 1
-                elif source_type in invalid_source_types:
+                elif source_type in _INVALID_FINANCIAL_SOURCE_TYPES:
                     # Invalid: Event/Date cannot have financial relationships
-                    logger.warning(f"Removing invalid relationship: {source} ({source_type}) -> {relation} -> {target}")
+                    logger.warning("Removing invalid relationship: %s (%s) -> %s -> %s", source, source_type, relation, target)
                     removed_count += 1
                     continue
                 elif source_type != 'Company':
                     # Source should be a Company for financial relationships
-                    logger.warning(f"Removing invalid relationship: {source} ({source_type}) -> {relation} -> {target} (source must be Company)")
+                    logger.warning("Removing invalid relationship: %s (%s) -> %s -> %s (source must be Company)",
+                                   source, source_type, relation, target)
                     removed_count += 1
                     continue
             
             # Check for other invalid relationships
-            if relation_upper in ['FACES_RISK'] and source_type != 'Company':
-                logger.warning(f"Removing invalid relationship: {source} ({source_type}) -> {relation} -> {target} (only Companies can face risks)")
+            if relation_upper == 'FACES_RISK' and source_type != 'Company':
+                logger.warning("Removing invalid relationship: %s (%s) -> %s -> %s (only Companies can face risks)",
+                               source, source_type, relation, target)
                 removed_count += 1
                 continue
             
-            if relation_upper in ['OWNS']:
+            if relation_upper == 'OWNS':
                 # OWNS relationships must be: Company -> OWNS -> Company
                 if source_type != 'Company':
-                    logger.warning(f"Removing invalid OWNS relationship: {source} ({source_type}) -> OWNS -> {target} (only Companies can own)")
+                    logger.warning("Removing invalid OWNS relationship: %s (%s) -> OWNS -> %s (only Companies can own)",
+                                   source, source_type, target)
                     removed_count += 1
                     continue
                 elif target_type != 'Company':
-                    logger.warning(f"Removing invalid OWNS relationship: {source} -> OWNS -> {target} ({target_type}) (can only own Companies)")
+                    logger.warning("Removing invalid OWNS relationship: %s -> OWNS -> %s (%s) (can only own Companies)",
+                                   source, target, target_type)
                     removed_count += 1
                     continue
                 else:
                     # Valid OWNS relationship: Company -> OWNS -> Company
-                    logger.debug(f"Valid OWNS relationship: {source} -> OWNS -> {target}")
+                    logger.debug("Valid OWNS relationship: %s -> OWNS -> %s", source, target)
                     valid_relationships.append(rel)
                     continue
             
@@ -629,22 +1089,158 @@ class FinancialDetective:
         
         return valid_relationships
     
-    def _process_single_chunk(self, chunk_text, existing_entities=None):
-        """Process a single chunk of text."""
-        prompt = self.get_extraction_prompt(existing_entities=existing_entities)
-        raw_response = self.llm.generate_extraction(prompt, chunk_text)
+    def _process_single_chunk(self, chunk_text, existing_entities=None, cache_chunk=False):
+        """
+        Process a single chunk of text, re-asking the LLM with the validation error if its output is unusable.
+        With cache_chunk, a validated result is stored in / served from the chunk cache (see _chunk_cache_key).
+        """
+        prompt = self._prompt
+        existing_context = self.get_existing_context(existing_entities)
+        cache_key, cached = self._lookup_chunk_cache(chunk_text, existing_context, cache_chunk)
+        if cached is not None:
+            return cached
+        feedback = []  # (rejected response, error) pairs, replayed to the LLM on retry
         
-        # Post-process the response
-        cleaned_response = clean_json_string(raw_response)
+        for attempt in range(Config.LLM_VALIDATION_RETRIES + 1):
+            raw_response = self._request_extraction(prompt, chunk_text, existing_context, feedback)
+            graph, data, error = self._check_response(raw_response)
+            if graph is not None:
+                if cache_key is not None:
+                    self.cache.put(cache_key, graph)
+                return graph
+            if attempt < Config.LLM_VALIDATION_RETRIES:
+                logger.warning(f"LLM output failed validation (attempt {attempt+1}): {error}, retrying with feedback...")
+                feedback.append((raw_response, error))
+                time.sleep(1.0 * (attempt + 1))
         
+        return self._salvage_response(data)
+    
+    def _request_extraction(self, prompt, chunk_text, existing_context, feedback):
+        """Get the raw LLM response for a chunk, streamed when Config.LLM_STREAM is set."""
+        if not Config.LLM_STREAM:
+            return self.llm.generate_extraction(prompt, chunk_text, existing_context=existing_context,
+                                                feedback=feedback)
+        
+        pieces = []
+        opened = closed = 0  # braces received so far - the answer can only be complete once they balance
+        started = time.perf_counter()
+        stream = self.llm.generate_extraction_stream(prompt, chunk_text, existing_context=existing_context,
+                                                     feedback=feedback)
         try:
-            data = json.loads(cleaned_response)
-            # Basic validation
-            if "entities" not in data or "relationships" not in data:
-                logger.warning("JSON missing required keys, using empty structure")
-                return {"entities": [], "relationships": []}
-            return data
-        except json.JSONDecodeError as e:
+            for piece in stream:
+                if not pieces:
+                    logger.info(f"First LLM tokens after {time.perf_counter() - started:.2f}s")
+                pieces.append(piece)
+                opened += piece.count('{')
+                if '}' not in piece:
+                    continue
+                closed += piece.count('}')
+                # The JSON answer is often complete before the stream ends (a closing note or code fence after it):
+                # stop reading there, closing the stream lets the server stop generating
+                if closed >= opened and is_complete_json_object("".join(pieces)):
+                    logger.info(f"LLM answer complete after {time.perf_counter() - started:.2f}s, closing the stream")
+                    break
+        except Exception as e:
+            # Connection dropped / timed out mid-answer: the part received so far goes through JSON repair
+            # and validation like any truncated response instead of losing the whole chunk
+            if not pieces:
+                raise
+            logger.warning(f"LLM stream interrupted after {sum(len(p) for p in pieces)} chars ({e}), using partial response")
+        finally:
+            stream.close()
+        return "".join(pieces)
+    
+    async def _process_single_chunk_async(self, chunk_text, cache_chunk=False):
+        """Async version of _process_single_chunk (no existing-entity context, chunks run concurrently)."""
+        prompt = self._prompt
+        cache_key, cached = self._lookup_chunk_cache(chunk_text, "", cache_chunk)
+        if cached is not None:
+            return cached
+        feedback = []
+        
+        for attempt in range(Config.LLM_VALIDATION_RETRIES + 1):
+            raw_response = await self.llm.generate_extraction_async(prompt, chunk_text, feedback=feedback)
+            graph, data, error = self._check_response(raw_response)
+            if graph is not None:
+                if cache_key is not None:
+                    self.cache.put(cache_key, graph)
+                return graph
+            if attempt < Config.LLM_VALIDATION_RETRIES:
+                logger.warning(f"LLM output failed validation (attempt {attempt+1}): {error}, retrying with feedback...")
+                feedback.append((raw_response, error))
+                await asyncio.sleep(1.0 * (attempt + 1))
+        
+        return self._salvage_response(data)
+    
+    def _lookup_chunk_cache(self, chunk_text, existing_context, cache_chunk):
+        """
+        Return (cache_key, cached chunk result) - cache_key is None when chunks aren't cached, cached None on a miss.
+        Chunk results share the extraction cache's prompt namespace, keyed on model, existing-entity note
+        and whitespace-normalized chunk text, so boilerplate repeated across documents is extracted once.
+        """
+        if not cache_chunk or self.cache is None or not Config.CACHE_CHUNKS:
+            return None, None
+        cache_key = (self._prompt_version, ExtractionCache.make_key("chunk", Config.LLM_MODEL_NAME, existing_context,
+                                                                    " ".join(chunk_text.split())))
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Chunk cache hit ({len(cached['entities'])} entities, {len(cached['relationships'])} relationships), skipping LLM")
+            cached = self._merge_chunk_results([cached])
+        return cache_key, cached
+    
+    def _check_response(self, raw_response):
+        """
+        Parse and validate an LLM response.
+        Returns (graph, parsed data, error) - graph is None (with an error for the LLM) if the response is unusable.
+        """
+        # Parsed once - the object found in the response is validated as is
+        data = self._parse_response(raw_response)
+        if data is None:
+            return None, None, "the response was not valid JSON"
+        
+        graph, error = validate_extraction(data)
+        if graph is None:
+            return None, data, error
+        # Drop exact repeats and records without ids in one hashed pass (the LLM often repeats itself)
+        return self._merge_chunk_results([graph]), data, None
+    
+    def _salvage_response(self, data):
+        """Out of retries - keep whatever records of the last response validate on their own."""
+        graph = salvage_extraction(data)
+        logger.warning(f"LLM output still invalid after {Config.LLM_VALIDATION_RETRIES} retries, "
+                       f"keeping {len(graph['entities'])} entities and {len(graph['relationships'])} relationships that validate")
+        return self._merge_chunk_results([graph])
+    
+    def _parse_response(self, raw_response):
+        """Parse the LLM response JSON (repairing it if possible). Returns None if it can't be parsed."""
+        # Post-process the response
+        data = extract_json_object(raw_response)
+        
+        # A response cut off at MAX_TOKENS has no complete graph object, so extract_json_object finds nothing
+        # or the largest complete inner object (one entity) - try to salvage the partial graph instead
+        is_graph = isinstance(data, dict) and "entities" in data and "relationships" in data
+        if (not is_graph or data == {"entities": [], "relationships": []}) and raw_response and '{' in raw_response:
+            repaired = self._repair_json(raw_response[raw_response.find('{'):])
+            if repaired is not None:
+                data = repaired
+        
+        if data is None:
             logger.error(f"Failed to parse JSON. LLM returned: {raw_response[:200]}...")
-            logger.warning("Returning empty knowledge graph structure")
-            return {"entities": [], "relationships": []}
+        return data
+    
+    def _repair_json(self, text):
+        """Try to repair malformed JSON with json_repair (if installed). Returns None if it can't be saved."""
+        if json_repair is None:
+            return None
+        try:
+            data = json_repair.loads(text)
+        except Exception as e:
+            logger.warning(f"JSON repair failed: {e}")
+            return None
+        if not isinstance(data, dict) or not data:
+            return None
+        # A response cut off inside "entities" never reached "relationships"
+        data.setdefault("entities", [])
+        data.setdefault("relationships", [])
+        logger.warning("LLM returned incomplete JSON, using repaired version")
+        return data
@@ -1,28 +1,115 @@
-from openai import OpenAI
+import asyncio
+import hashlib
+import importlib.util
+import logging
+from functools import lru_cache
+try:
+    import httpx  # Installed with openai - used to configure the connection pool
+except ImportError:
+    httpx = None
+from openai import AsyncOpenAI, OpenAI
 from src.config import Config
-from src.utils import setup_logger
+from src.llm_parallel import RequestRateLimiter
 
-logger = setup_logger()
+logger = logging.getLogger(__name__)
+
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_JSON_ONLY_INSTRUCTION = ("You are a JSON-only API. You MUST respond with ONLY valid JSON. No explanations, no markdown, "
+                          "no text before or after. Just pure JSON starting with { and ending with }.")
+
+@lru_cache(maxsize=8)
+def _system_message(prompt):
+    """ The system message for a prompt, built once - every request shares the same (read-only) dict and string """
+    return {"role": "system", "content": f"{_JSON_ONLY_INSTRUCTION}\n\n{prompt}"}
+
+@lru_cache(maxsize=8)
+def _prefix_version(system_content):
+    """ Short hash of the system message - the prefix a server-side prompt cache keys on """
+    return hashlib.sha256(system_content.encode('utf-8')).hexdigest()[:16]
 
 class LLMEngine:
     def __init__(self):
         # Initialize OpenAI client pointing to the local server
         self.client = OpenAI(
             base_url=Config.LLM_API_URL,
-            api_key="sk-placeholder" # Local servers usually ignore this
+            api_key="sk-placeholder", # Local servers usually ignore this
+            http_client=self._http_client(httpx.Client) if httpx is not None else None
         )
+        # Async client for analyze_async, created on first use (bound to the event loop it was created in)
+        self._async_client = None
+        self._async_loop = None
+        # Shared by all requests of this engine (threads and coroutines) when the server has rate limits
+        self.rate_limiter = None
+        if Config.LLM_MAX_REQUESTS_PER_MINUTE or Config.LLM_MAX_TOKENS_PER_MINUTE:
+            self.rate_limiter = RequestRateLimiter(Config.LLM_MAX_REQUESTS_PER_MINUTE, Config.LLM_MAX_TOKENS_PER_MINUTE)
+        # Extra options for every completion request
+        self._request_options = {}
+        if Config.LLM_JSON_MODE:
+            self._request_options["response_format"] = {"type": "json_object"}
 
-    def generate_extraction(self, prompt, context_text):
+    @staticmethod
+    def _http_client(client_class):
+        # One connection per request that can be in flight at once, all kept alive (no TCP / TLS setup per chunk)
+        # and multiplexed over HTTP/2 when the server and the h2 package support it. Requests beyond the cap
+        # (e.g. a larger max_in_flight in analyze_many) wait for a free connection
+        max_connections = max(1, Config.LLM_MAX_CONCURRENCY)
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        # (follow_redirects as in the OpenAI client's own default transport)
+        return client_class(http2=Config.LLM_HTTP2 and _HTTP2_AVAILABLE, limits=limits, follow_redirects=True)
+
+    def _build_messages(self, prompt, context_text, existing_context="", feedback=None):
         # Safety limit: truncate if text is still too long (shouldn't happen if chunking works)
-        max_context_length = 12000
+        max_context_length = Config.MAX_CONTEXT_CHARS
         if len(context_text) > max_context_length:
             logger.warning(f"Context text still too long ({len(context_text)} chars), truncating to {max_context_length}")
             context_text = context_text[:max_context_length]
         
+        # The static instructions form a byte-identical system message on every call, so servers with
+        # prefix caching (vLLM, llama.cpp, OpenAI) only process them once; only the user message changes.
+        # It is also the same string object each time, so hashing it for the prefix version is cached too
+        user_content = f"TEXT TO ANALYZE:\n{context_text}\n\nRemember: Output ONLY valid JSON, nothing else."
+        if existing_context:
+            user_content = f"{existing_context}\n\n{user_content}"
+        
         messages = [
-            {"role": "system", "content": "You are a JSON-only API. You MUST respond with ONLY valid JSON. No explanations, no markdown, no text before or after. Just pure JSON starting with { and ending with }."},
-            {"role": "user", "content": f"{prompt}\n\nTEXT TO ANALYZE:\n{context_text}\n\nRemember: Output ONLY valid JSON, nothing else."}
+            _system_message(prompt),
+            {"role": "user", "content": user_content}
         ]
+        # Retry with feedback: replay each rejected answer together with what was wrong with it. Only the end of
+        # a long answer is replayed - the usual failure is an answer cut off at MAX_TOKENS, and replaying it
+        # whole on every retry would push the request past the context window
+        for rejected_response, error in feedback or ():
+            rejected_response = rejected_response or ""
+            if len(rejected_response) > Config.LLM_FEEDBACK_CHARS:
+                rejected_response = "..." + rejected_response[-Config.LLM_FEEDBACK_CHARS:]
+            messages.append({"role": "assistant", "content": rejected_response})
+            messages.append({"role": "user", "content": f"Your output had error: {error}. Fix it and output ONLY the corrected JSON."})
+        return messages
+
+    def _request_headers(self, messages):
+        # Tags each request with the version of its static prefix, so proxies / server logs can group
+        # requests by prompt and a changed prefix (cache misses) is visible per request
+        return {"X-Prompt-Version": _prefix_version(messages[0]["content"])}
+
+    def _estimate_tokens(self, messages):
+        # What a request can count against a tokens-per-minute limit: the prompt plus the full response budget
+        return sum(len(message["content"]) for message in messages) // Config.CHARS_PER_TOKEN + Config.MAX_TOKENS
+
+    def _log_usage(self, response):
+        # cached_tokens is reported by OpenAI-compatible servers that support prompt caching
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            return
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = getattr(details, 'cached_tokens', None) or 0
+        logger.info(f"LLM usage: {usage.prompt_tokens} prompt tokens ({cached_tokens} cached), {usage.completion_tokens} completion tokens")
+
+    def generate_extraction(self, prompt, context_text, existing_context="", feedback=None):
+        messages = self._build_messages(prompt, context_text, existing_context, feedback)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(self._estimate_tokens(messages))
     
         try:
             logger.info("Sending request to LLM...")
@@ -30,9 +117,75 @@ class LLMEngine:
                 model=Config.LLM_MODEL_NAME,
                 messages=messages,
                 temperature=Config.temperature,
-                max_tokens=Config.MAX_TOKENS
+                max_tokens=Config.MAX_TOKENS,
+                extra_headers=self._request_headers(messages),
+                **self._request_options
+            )
+            self._log_usage(response)
+            return response.choices[0].message.content
+        except Exception as e:
+            logger.error(f"LLM API Error: {e}")
+            raise
+
+    def generate_extraction_stream(self, prompt, context_text, existing_context="", feedback=None):
+        """ Like generate_extraction, but yields the response text piece by piece as the server produces it """
+        messages = self._build_messages(prompt, context_text, existing_context, feedback)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(self._estimate_tokens(messages))
+    
+        try:
+            logger.info("Sending streaming request to LLM...")
+            stream = self.client.chat.completions.create(
+                model=Config.LLM_MODEL_NAME,
+                messages=messages,
+                temperature=Config.temperature,
+                max_tokens=Config.MAX_TOKENS,
+                stream=True,
+                extra_headers=self._request_headers(messages),
+                **self._request_options
+            )
+            try:
+                for event in stream:
+                    if event.choices and event.choices[0].delta.content:
+                        yield event.choices[0].delta.content
+            finally:
+                # Also runs when the caller stops reading early (generator closed): drop the connection
+                # so the server stops generating the rest of the answer
+                stream.response.close()
+        except Exception as e:
+            logger.error(f"LLM API Error: {e}")
+            raise
+
+    def _get_async_client(self):
+        # httpx connection pools can't be shared between event loops (e.g. two asyncio.run calls)
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = AsyncOpenAI(
+                base_url=Config.LLM_API_URL,
+                api_key="sk-placeholder",
+                http_client=self._http_client(httpx.AsyncClient) if httpx is not None else None
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    async def generate_extraction_async(self, prompt, context_text, existing_context="", feedback=None):
+        """ Async version of generate_extraction - lets many chunk requests wait on the server at once """
+        messages = self._build_messages(prompt, context_text, existing_context, feedback)
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async(self._estimate_tokens(messages))
+    
+        try:
+            logger.info("Sending request to LLM...")
+            response = await self._get_async_client().chat.completions.create(
+                model=Config.LLM_MODEL_NAME,
+                messages=messages,
+                temperature=Config.temperature,
+                max_tokens=Config.MAX_TOKENS,
+                extra_headers=self._request_headers(messages),
+                **self._request_options
             )
+            self._log_usage(response)
             return response.choices[0].message.content
         except Exception as e:
             logger.error(f"LLM API Error: {e}")
-            raise
\ No newline at end of file
+            raise
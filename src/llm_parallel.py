@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+
+class RequestRateLimiter:
+    """
+    Requests-per-minute / tokens-per-minute limiter for LLM calls (the capacity scheme of the OpenAI cookbook's
+    api_request_parallel_processor): each budget refills continuously on the monotonic clock, and a request
+    waits until both budgets have room for it. A limit of None is not enforced.
+    Safe to share between the worker threads of analyze() and the coroutines of analyze_async().
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        # Start with full budgets, so the first burst isn't delayed
+        self._request_capacity = float(requests_per_minute or 0)
+        self._token_capacity = float(tokens_per_minute or 0)
+        self._last_update = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens):
+        """ Take capacity for one request of `tokens` tokens. Returns 0, or the seconds to wait before asking again """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._last_update
+            self._last_update = now
+
+            wait = 0.0
+            if self.requests_per_minute:
+                self._request_capacity = min(self.requests_per_minute,
+                                             self._request_capacity + elapsed * self.requests_per_minute / 60)
+                if self._request_capacity < 1:
+                    wait = (1 - self._request_capacity) * 60 / self.requests_per_minute
+            if self.tokens_per_minute:
+                # A single request larger than the whole budget only waits for a full budget
+                tokens = min(tokens, self.tokens_per_minute)
+                self._token_capacity = min(self.tokens_per_minute,
+                                           self._token_capacity + elapsed * self.tokens_per_minute / 60)
+                if self._token_capacity < tokens:
+                    wait = max(wait, (tokens - self._token_capacity) * 60 / self.tokens_per_minute)
+            if wait > 0:
+                return wait
+
+            if self.requests_per_minute:
+                self._request_capacity -= 1
+            if self.tokens_per_minute:
+                self._token_capacity -= tokens
+            return 0.0
+
+    def acquire(self, tokens):
+        """ Block until a request of `tokens` tokens fits both budgets """
+        while True:
+            wait = self._reserve(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens):
+        """ Async version of acquire() - waits without blocking the event loop """
+        while True:
+            wait = self._reserve(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
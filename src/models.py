@@ -0,0 +1,98 @@
+import sys
+from typing import List, Optional
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+# Vocabulary the prompt asks for. Validated records use these exact (shared) string objects, so the
+# dedup sets / type checks downstream compare canonical keys instead of the LLM's spelling variants
+RELATION_TYPES = ("OWNS", "FOUNDER", "MANAGING_DIRECTOR", "CHAIRMAN", "OPERATES", "EMPLOYS", "LOCATED_IN",
+                  "FACES_RISK", "HAS_REVENUE", "HAS_PROFIT", "HAS_ASSET", "HAS_EQUITY", "HAS_DEBT",
+                  "HAS_EXPORTS", "HAS_CSR_CONTRIBUTION", "RELATED_TO")
+# Date / Event / Document are included so the filter in the extractor recognises them in any case
+ENTITY_TYPES = ("Company", "Person", "Location", "Dollar Amount", "Risk", "Product", "Framework", "Metric",
+                "Date", "Event", "Document")
+
+_RELATIONS_BY_KEY = {relation: relation for relation in RELATION_TYPES}
+_ENTITY_TYPES_BY_KEY = {entity_type.casefold(): entity_type for entity_type in ENTITY_TYPES}
+
+class _GraphRecord(BaseModel):
+    # Keep any extra keys the LLM adds (e.g. "confidence") instead of rejecting the response
+    model_config = ConfigDict(extra='allow')
+
+    @field_validator('*', mode='before')
+    @classmethod
+    def _numbers_to_str(cls, value):
+        # The LLM sometimes emits amounts / ids as bare numbers (e.g. "id": 2024)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        return value
+
+class Entity(_GraphRecord):
+    """ A node of the knowledge graph """
+    id: str = Field(validation_alias=AliasChoices('id', 'name'))
+    type: Optional[str] = None
+    metadata: Optional[str] = None
+
+    @field_validator('type')
+    @classmethod
+    def _canonical_type(cls, value):
+        # "company" / " Dollar amount " -> "Company" / "Dollar Amount"; unknown types are kept as written
+        if value is None:
+            return value
+        value = value.strip()
+        return _ENTITY_TYPES_BY_KEY.get(value.casefold(), value)
+
+    @field_validator('metadata', mode='before')
+    @classmethod
+    def _metadata_to_str(cls, value):
+        # Metadata is free text - flatten dicts / lists instead of failing the whole response
+        if value is not None and not isinstance(value, str):
+            return str(value)
+        return value
+
+class Relationship(_GraphRecord):
+    """ A directed edge of the knowledge graph """
+    source: str = Field(validation_alias=AliasChoices('source', 'entity1', 'from'))
+    target: str = Field(validation_alias=AliasChoices('target', 'entity2', 'to'))
+    relation: str = Field('RELATED_TO', validation_alias=AliasChoices('relation', 'type', 'relationship'))
+
+    @field_validator('relation')
+    @classmethod
+    def _canonical_relation(cls, value):
+        # "owns" / "Has Revenue" / "has-profit" -> "OWNS" / "HAS_REVENUE" / "HAS_PROFIT"
+        key = "_".join(value.strip().upper().replace('-', ' ').split()) or "RELATED_TO"
+        return _RELATIONS_BY_KEY.get(key) or sys.intern(key)
+
+class Extraction(BaseModel):
+    """ One LLM extraction response """
+    entities: List[Entity]
+    relationships: List[Relationship]
+
+def validate_extraction(data):
+    """
+    Validate a parsed LLM response.
+    Returns (graph dict, None) on success or (None, error message) to send back to the LLM.
+    """
+    try:
+        extraction = Extraction.model_validate(data)
+    except ValidationError as e:
+        # Short "where: what" lines - this text is sent back to the LLM as feedback
+        errors = [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                  for error in e.errors(include_url=False)[:10]]
+        return None, "; ".join(errors)
+    return extraction.model_dump(exclude_none=True), None
+
+def salvage_extraction(data):
+    """ Keep the records that validate on their own, for when the response as a whole never does """
+    graph = {"entities": [], "relationships": []}
+    if not isinstance(data, dict):
+        return graph
+    for key, model in (("entities", Entity), ("relationships", Relationship)):
+        records = data.get(key)
+        if not isinstance(records, list):
+            continue
+        for record in records:
+            try:
+                graph[key].append(model.model_validate(record).model_dump(exclude_none=True))
+            except ValidationError:
+                continue
+    return graph
@@ -1,10 +1,35 @@
-from typing import List, Dict
-from .utils import setup_logger
+import logging
+from bisect import bisect_left
+from typing import List, Dict, Tuple
 from .config import Config
 
-logger = setup_logger()
+logger = logging.getLogger(__name__)
 
 
+def _collapse_runs(text: str, char: str, keep: int) -> str:
+    """ Shorten every run of more than `keep` consecutive `char`s to `keep`, in one split / join pass """
+    run = char * (keep + 1)
+    if run not in text:
+        return text
+    
+    # Whatever is left of a run after a split point starts the next part - strip it, and drop parts that were
+    # nothing but run (several split points in one long run)
+    parts = text.split(run)
+    pieces = [parts[0]]
+    for part in parts[1:]:
+        part = part.lstrip(char)
+        if part:
+            pieces.append(part)
+    collapsed = (char * keep).join(pieces)
+    # A run at the very end has no part after it to join against
+    if not parts[-1].lstrip(char):
+        collapsed += char * keep
+    return collapsed
+
+
+# Sentence-ending punctuation followed by the character that may end the sentence there
+_SENTENCE_END_MARKERS = ('. ', '! ', '? ', '.\n', '!\n', '?\n')
+
 class TextTokenizer:
     """
     Tokenizes and preprocesses raw text using only string operations (NO REGEX).
@@ -25,12 +50,11 @@ class TextTokenizer:
         logger.info("Cleaning text using string operations only (minimal cleaning)...")
         
         # Only remove excessive whitespace (more than 2 spaces)
-        while '   ' in text:  # Only remove 3+ consecutive spaces
-            text = text.replace('   ', '  ')
+        # (one split / join pass per rule instead of replacing until no run is left)
+        text = _collapse_runs(text, ' ', 2)
         
         # Only remove excessive newlines (more than 3 consecutive) 
-        while '\n\n\n\n' in text:  
-            text = text.replace('\n\n\n\n', '\n\n\n')
+        text = _collapse_runs(text, '\n', 3)
         
         # Normalize page separators (simple string replacement) - but keep them
         text = text.replace('---PAGE BREAK---', '--- PAGE BREAK ---')
@@ -43,124 +67,102 @@ class TextTokenizer:
         return text
 
     # process clean text into sentences by checking for sentence ending punctuation like '.', '!', '?'
-    def split_into_sentences(self, text: str) -> List[str]:
+    def sentence_spans(self, text: str) -> List[Tuple[int, int]]:
         
-        """ Split text into sentences using simple string operations (NO REGEX). """
+        """ Find the sentences of text as (start, end) offsets, using simple string operations (NO REGEX). """
         
         # safe fall back text will always present
         if not text:
             return []
         
-        sentences = []
-        current_sentence = []
-        i = 0
+        # A sentence ends at '.', '!' or '?' followed by a newline, or by a space and then a capital letter or
+        # currency sign. Only these two-character markers are looked at (str.find runs in C), not every character
+        text_length = len(text)
+        sentence_ends = []
+        for marker in _SENTENCE_END_MARKERS:
+            i = text.find(marker)
+            while i != -1:
+                if marker[1] == '\n' or (i + 2 < text_length and (text[i + 2].isupper() or text[i + 2] in '₹$')):
+                    sentence_ends.append(i + 1)
+                i = text.find(marker, i + 1)
+        sentence_ends.sort()
+        sentence_ends.append(text_length)  # remaining text is the last sentence
         
-        while i < len(text): # will process untill the lenght of the text
-            char = text[i]  # every character in the text will be processed
-            current_sentence.append(char) # add the character to the current sentence
-            
-            # if the character is a sentence ending punctuation
-            # Check for sentence ending punctuation
-            if char in '.!?':
-                # Look ahead to see if next char is space and following is capital
-                if i + 1 < len(text):
-                    next_char = text[i + 1]
-                    if next_char == ' ':
-                        # Check if character after space is capital letter or currency
-                        if i + 2 < len(text):
-                            char_after_space = text[i + 2]
-                            if char_after_space.isupper() or char_after_space in '₹$':
-                                # End of sentence found
-                                sentence = ''.join(current_sentence).strip()
-                                if sentence:
-                                    sentences.append(sentence)
-                                current_sentence = []
-                                i += 1  # Skip the space
-                                continue
-                    elif next_char == '\n':
-                        # Newline after punctuation might indicate sentence end
-                        sentence = ''.join(current_sentence).strip()
-                        if sentence:
-                            sentences.append(sentence)
-                        current_sentence = []
-                        i += 1  # Skip the newline
-                        continue
-            
-            i += 1
+        # Offsets of each sentence without its surrounding whitespace (blank pieces are no sentence)
+        spans = []
+        start = 0
+        for end in sentence_ends:
+            piece = text[start:end]
+            stripped = piece.lstrip()
+            if stripped:
+                spans.append((end - len(stripped), start + len(piece.rstrip())))
+            start = end
         
-        # Add remaining text as a sentence
-        if current_sentence:
-            sentence = ''.join(current_sentence).strip()
-            if sentence:
-                sentences.append(sentence)
+        logger.info(f"Split text into {len(spans)} sentences")
         
-        # Filter out empty sentences
-        sentences = [s for s in sentences if s.strip()]
+        return spans
+
+    def split_into_sentences(self, text: str) -> List[str]:
         
-        logger.info(f"Split text into {len(sentences)} sentences")
+        """ Split text into sentences using simple string operations (NO REGEX). """
         
-        return sentences
+        return [text[start:end] for start, end in self.sentence_spans(text)]
     
     # process the sentences into chunks
     def chunk_text_by_sentences(self, sentences: List[str]) -> List[Dict[str, any]]:
         
-        """ Chunk sentences into larger blocks with overlap. """
+        """ Chunk sentences into larger blocks with overlap (the sentences of a chunk are joined with a space). """
+        # The sentences joined once, with their offsets - chunks are then slices of this text
+        spans = []
+        position = 0
+        for sentence in sentences:
+            spans.append((position, position + len(sentence)))
+            position += len(sentence) + 1
+        return self.chunk_text_by_spans(' '.join(sentences), spans)
+
+    def chunk_text_by_spans(self, text: str, spans: List[Tuple[int, int]]) -> List[Dict[str, any]]:
+        
+        """ Chunk sentences, given as (start, end) offsets into text, into larger blocks with overlap. """
         chunks = []
-        current_chunk_sentences = []
-        current_chunk_length = 0
+        # Sentence starts in text order, for the overlap lookup (bisect instead of walking back sentence by sentence)
+        span_starts = [start for start, _ in spans]
+        # The current chunk is spans[first:i] - its text is text[start of first:end of i - 1]
+        first = 0
         
         # process all the sentences one by one
-        for sentence in sentences:
-            # Calculate the length of the sentence including the space/newline
-            sentence_length = len(sentence) + 1  # +1 for space/newline
-            
-            """ if the sentence length is less than the chunk size, 
-             add the sentence to the current chunk and update the current chunk length """
-            if current_chunk_length + sentence_length <= self.chunk_size:
-                current_chunk_sentences.append(sentence)
-                current_chunk_length += sentence_length
-            else:
+        for i, (start, end) in enumerate(spans):
+            """ if the chunk still fits the chunk size with this sentence (plus the space/newline after it),
+             add the sentence to the current chunk """
+            chunk_start = span_starts[first] if first < i else start
+            if end - chunk_start + 1 > self.chunk_size:
                 # Current sentence doesn't fit, save current chunk
-                if current_chunk_sentences:
-                    chunk_text = ' '.join(current_chunk_sentences)
-                    chunks.append({
-                        'text': chunk_text,
-                        'size': len(chunk_text),
-                        'sentence_count': len(current_chunk_sentences),
-                        'chunk_index': len(chunks)
-                    })
-
-                # Start new chunk with overlap
-                overlap_sentences = []
-                overlap_length = 0
-                # Add sentences from the end of the previous chunk to create overlap
-                for i in range(len(current_chunk_sentences) - 1, -1, -1):
-                    s = current_chunk_sentences[i]
-                    if overlap_length + len(s) + 1 <= self.chunk_overlap:
-                        overlap_sentences.insert(0, s)
-                        overlap_length += len(s) + 1
-                    else:
-                        break
-                
-                current_chunk_sentences = overlap_sentences + [sentence]
-                current_chunk_length = overlap_length + sentence_length
+                if first < i:
+                    self._append_span_chunk(chunks, text, spans[first:i])
+                    # Start new chunk with overlap: the sentences at the end of the previous chunk that fit
+                    # the overlap (with the space/newline after each)
+                    chunk_end = spans[i - 1][1]
+                    first = bisect_left(span_starts, chunk_end + 1 - self.chunk_overlap, first, i)
         
         # Add the last chunk if it exists
-        if current_chunk_sentences:
-            # join the sentences in the current chunk to form a chunk text
-            chunk_text = ' '.join(current_chunk_sentences)
-            chunks.append({
-                'text': chunk_text,
-                'size': len(chunk_text),
-                'sentence_count': len(current_chunk_sentences),
-                'chunk_index': len(chunks)
-            })
+        if first < len(spans):
+            self._append_span_chunk(chunks, text, spans[first:])
         """ If you try to print the chunks with below loop then got the how many
             characters are in the chunk and you can also see the text of the chunk
         # for i in chunks:
         #     print(len(i['text']), i['text']) """
         return chunks
 
+    @staticmethod
+    def _append_span_chunk(chunks, text, chunk_spans):
+        # One slice of the text per chunk, from the first sentence's start to the last one's end
+        chunk_text = text[chunk_spans[0][0]:chunk_spans[-1][1]]
+        chunks.append({
+            'text': chunk_text,
+            'size': len(chunk_text),
+            'sentence_count': len(chunk_spans),
+            'chunk_index': len(chunks)
+        })
+
     def chunk_text_by_paragraphs(self, text: str) -> List[Dict[str, any]]:
         """
         Split text into paragraphs based on double newlines.
@@ -186,17 +188,18 @@ class TextTokenizer:
                         'chunk_index': len(chunks)
                     })
 
-                overlap_paragraphs = []
+                # Walk back to the first paragraph of the overlap, then take the tail in one slice
+                overlap_start = len(current_chunk_paragraphs)
                 overlap_length = 0
-                for i in range(len(current_chunk_paragraphs) - 1, -1, -1):
-                    p = current_chunk_paragraphs[i]
-                    if overlap_length + len(p) + 2 <= self.chunk_overlap:
-                        overlap_paragraphs.insert(0, p)
-                        overlap_length += len(p) + 2
-                    else:
+                while overlap_start > 0:
+                    p = current_chunk_paragraphs[overlap_start - 1]
+                    if overlap_length + len(p) + 2 > self.chunk_overlap:
                         break
+                    overlap_start -= 1
+                    overlap_length += len(p) + 2
                 
-                current_chunk_paragraphs = overlap_paragraphs + [paragraph]
+                current_chunk_paragraphs = current_chunk_paragraphs[overlap_start:]
+                current_chunk_paragraphs.append(paragraph)
                 current_chunk_length = overlap_length + paragraph_length
         
         if current_chunk_paragraphs:
@@ -221,18 +224,15 @@ class TextTokenizer:
         
         while start < text_length:
             end = min(start + self.chunk_size, text_length)
-            chunk_text = text[start:end]
             
             # Try to find a space or newline near the end to break cleanly
             if end < text_length:
-                # Look for last space or newline in the chunk
-                last_space = chunk_text.rfind(' ')
-                last_newline = chunk_text.rfind('\n')
-                break_point = max(last_space, last_newline)
-                
-                if break_point != -1 and break_point > self.chunk_size * 0.8:
-                    chunk_text = chunk_text[:break_point]
-                    end = start + break_point
+                # Only breaks in the last 20% of the chunk are used, so only that tail is searched
+                tail_start = start + int(self.chunk_size * 0.8) + 1
+                break_point = max(text.rfind(' ', tail_start, end), text.rfind('\n', tail_start, end))
+                if break_point != -1:
+                    end = break_point
+            chunk_text = text[start:end]
             
             chunks.append({
                 'text': chunk_text.strip(),
@@ -240,6 +240,10 @@ class TextTokenizer:
                 'chunk_index': chunk_index
             })
             
+            # The last chunk reaches the end of the text (stepping back by the overlap would repeat it forever)
+            if end >= text_length:
+                break
+            
             # Move start position with overlap
             start = end - self.chunk_overlap
             if start < 0:
@@ -271,8 +275,8 @@ class TextTokenizer:
             
             logger.info(f"Chunking text using '{chunk_strategy}' strategy...")
             if chunk_strategy == "sentence": # best option to go with sentence
-                sentences = self.split_into_sentences(text)
-                chunks = self.chunk_text_by_sentences(sentences)
+                # Sentence offsets only - each chunk is one slice of the text, no per-sentence strings
+                chunks = self.chunk_text_by_spans(text, self.sentence_spans(text))
             elif chunk_strategy == "paragraph":
                 chunks = self.chunk_text_by_paragraphs(text)
             elif chunk_strategy == "fixed":
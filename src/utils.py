@@ -1,12 +1,23 @@
 import logging
 import json
 import os
+try:
+    import orjson  # Native JSON parser, several times faster than json.loads on multi-KB responses
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger("FinancialDetective")
 
+# raw_decode parses one JSON value from an offset and reports where it ends, in C
+_JSON_DECODER = json.JSONDecoder()
+
 def setup_logger(name="FinancialDetective"):
-    logger = logging.getLogger(name)
-    if not logger.handlers:
+    """
+    Configure the root logger once (console + log file) and return the named logger.
+    Modules get their own logger with logging.getLogger(__name__), which propagates here.
+    """
+    root = logging.getLogger()
+    if not root.handlers:
         
         # Import Config here to avoid circular import issues
         from .config import Config
@@ -17,7 +28,7 @@ def setup_logger(name="FinancialDetective"):
         # Console handler
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
+        root.addHandler(console_handler)
         
         # File handler
         log_dir = Config.OUTPUT_DIR
@@ -27,118 +38,109 @@ def setup_logger(name="FinancialDetective"):
         log_file_path = os.path.join(log_dir, Config.LOG_FILENAME)
         file_handler = logging.FileHandler(log_file_path, mode='a', encoding='utf-8')
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        root.addHandler(file_handler)
         
-        logger.setLevel(logging.INFO)
-        logger.info(f"Logger initialized. Log file: {log_file_path}")
+        root.setLevel(logging.INFO)
+        root.info(f"Logger initialized. Log file: {log_file_path}")
         
-    return logger
+    return logging.getLogger(name)
 
-def clean_json_string(json_str):
+def parse_llm_json(text):
+    """
+    Parse JSON text (str or bytes) with orjson when installed, else the standard library.
+    Raises json.JSONDecodeError either way (orjson's error subclasses it).
+    """
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+def is_complete_json_object(text):
+    """ True if text (after anything before its first "{") already holds a complete JSON object """
+    start_idx = text.find('{')
+    if start_idx == -1:
+        return False
+    try:
+        _JSON_DECODER.raw_decode(text, start_idx)
+        return True
+    except ValueError:
+        return False
+
+def extract_json_object(json_str):
     """
-    Cleans markdown formatting and extracts JSON from LLM responses.
+    Find the JSON object in an LLM response and return it parsed (dict), or None if there is none.
     Uses ONLY string operations (NO REGEX) to comply with competition constraints.
     Handles multiple formats: markdown code blocks, text with JSON, etc.
     """
     if not json_str:
-        return '{"entities": [], "relationships": []}'
+        return None
+    
+    # Fast path: most responses are already a bare JSON object - one parse, and the result is returned as is
+    stripped = json_str.strip()
+    if stripped.startswith('{') and stripped.endswith('}'):
+        try:
+            return parse_llm_json(stripped)
+        except ValueError:
+            pass
     
     # First, try to extract from markdown code blocks using string operations only
     if "```" in json_str:
         # Try to find ```json ... ``` or ``` ... ```
         json_str_lower = json_str.lower()
         
-        # Look for ```json
-        json_marker = "```json"
-        if json_marker in json_str_lower:
-            start_marker = json_str_lower.find(json_marker)
-            start_content = start_marker + len(json_marker)
-            # Find the closing ```
-            end_marker = json_str.find("```", start_content)
-            if end_marker != -1:
-                extracted = json_str[start_content:end_marker].strip()
-                # Try to parse it to validate
-                try:
-                    json.loads(extracted)
-                    return extracted
-                except:
-                    json_str = extracted
-        
-        # If no ```json found, try generic ```
-        elif "```" in json_str:
-            first_backtick = json_str.find("```")
-            start_content = first_backtick + 3
-            # Find the next closing ```
-            end_marker = json_str.find("```", start_content)
-            if end_marker != -1:
-                extracted = json_str[start_content:end_marker].strip()
-                # Try to parse it to validate
-                try:
-                    json.loads(extracted)
-                    return extracted
-                except:
-                    json_str = extracted
-    
-    # Try to find JSON object by looking for balanced braces (NO REGEX)
-    # Start from the first { and find the matching }
-    start_idx = json_str.find('{')
-    if start_idx != -1:
-        brace_count = 0
-        end_idx = start_idx
-        for i in range(start_idx, len(json_str)):
-            if json_str[i] == '{':
-                brace_count += 1
-            elif json_str[i] == '}':
-                brace_count -= 1
-                if brace_count == 0:
-                    end_idx = i + 1
-                    break
-        
-        if brace_count == 0:
-            json_candidate = json_str[start_idx:end_idx].strip()
+        # Look for ```json, else a generic ```
+        json_marker = "```json" if "```json" in json_str_lower else "```"
+        start_content = json_str_lower.find(json_marker) + len(json_marker)
+        # Find the closing ```
+        end_marker = json_str.find("```", start_content)
+        if end_marker != -1:
+            extracted = json_str[start_content:end_marker].strip()
             # Try to parse it
             try:
-                json.loads(json_candidate)
-                return json_candidate
-            except:
+                data = parse_llm_json(extracted)
+                if isinstance(data, dict):
+                    return data
+            except ValueError:
                 pass
+            json_str = extracted
+    
+    # Parse from the first { - raw_decode returns where the object ends, so trailing text after it is ignored
+    # and braces inside strings can't throw off the match (string operations + the C JSON scanner, NO REGEX)
+    start_idx = json_str.find('{')
+    if start_idx != -1:
+        try:
+            return _JSON_DECODER.raw_decode(json_str, start_idx)[0]
+        except ValueError:
+            pass
     
-    # Fallback: Try to find multiple JSON objects by scanning for balanced braces
-    # This is a simple approach without regex - find all potential JSON objects
-    json_candidates = []
-    search_start = 0
+    # Fallback: keep the largest complete JSON object further in (e.g. an entity of a truncated response)
+    largest, largest_length = None, 0
+    search_start = start_idx + 1
     
     while True:
         start_idx = json_str.find('{', search_start)
         if start_idx == -1:
             break
         
-        brace_count = 0
-        end_idx = start_idx
-        for i in range(start_idx, len(json_str)):
-            if json_str[i] == '{':
-                brace_count += 1
-            elif json_str[i] == '}':
-                brace_count -= 1
-                if brace_count == 0:
-                    end_idx = i + 1
-                    break
-        
-        if brace_count == 0:
-            candidate = json_str[start_idx:end_idx].strip()
-            try:
-                json.loads(candidate)  # Validate it's valid JSON
-                json_candidates.append((candidate, len(candidate)))
-            except:
-                pass
-        
+        try:
+            data, end_idx = _JSON_DECODER.raw_decode(json_str, start_idx)
+        except ValueError:
+            # Not a complete object from here (e.g. truncated): try the next "{" inside it
+            search_start = start_idx + 1
+            continue
+        if end_idx - start_idx > largest_length:
+            largest, largest_length = data, end_idx - start_idx
         search_start = end_idx
     
-    # Find the largest valid JSON object
-    if json_candidates:
-        largest_match = max(json_candidates, key=lambda x: x[1])[0]
-        return largest_match
-    
-    # If no JSON found, return empty JSON object
-    logger.warning(f"No valid JSON found in LLM response. First 200 chars: {json_str[:200]}")
-    return '{"entities": [], "relationships": []}'
\ No newline at end of file
+    if largest is None:
+        logger.warning(f"No valid JSON found in LLM response. First 200 chars: {json_str[:200]}")
+    return largest
+
+def clean_json_string(json_str):
+    """
+    Cleans markdown formatting and extracts JSON from LLM responses (as JSON text, see extract_json_object).
+    Returns an empty graph if the response has no JSON object.
+    """
+    data = extract_json_object(json_str)
+    if data is None:
+        return '{"entities": [], "relationships": []}'
+    return json.dumps(data, ensure_ascii=False)
@@ -1,8 +1,14 @@
 import networkx as nx
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import logging
 import math
-from .utils import setup_logger
+import re
+from collections import defaultdict
+from functools import lru_cache
+from .config import Config
 
 # Configure matplotlib to properly display currency symbols ($ and ₹)
 plt.rcParams['font.family'] = 'DejaVu Sans'  # Font that supports currency symbols
@@ -11,15 +17,29 @@ plt.rcParams['font.size'] = 10  # Default font size
 # Disable LaTeX rendering to prevent $ from being interpreted as math mode
 plt.rcParams['text.usetex'] = False
 
-logger = setup_logger()
+logger = logging.getLogger(__name__)
+
+# Currency label fixes ("US 38.7 billion" -> "$ 38.7 billion"), compiled once at import
+_US_AMOUNT_RE = re.compile(r'.*US\s+\d')
+_US_RE = re.compile(r'US\s+')
+
+# Edge colors by relationship: the first rule with a keyword contained in the relation wins
+_EDGE_COLOR_RULES = (
+    (('OWNS', 'SUBSIDIARY', 'ACQUIRED'), '#E74C3C'),  # Red
+    (('HAS_PROFIT', 'HAS_REVENUE', 'HAS_ASSET', 'HAS_DEBT', 'HAS_EQUITY'), '#2ECC71'),  # Green
+    (('CHAIRMAN', 'FOUNDER', 'CEO', 'DIRECTOR', 'EMPLOYS'), '#3498DB'),  # Blue
+    (('FACES_RISK',), '#E67E22'),  # Orange
+    (('FOLLOWS', 'USES'), '#9B59B6'),  # Purple
+)
+_DEFAULT_EDGE_COLOR = '#7F8C8D'  # Gray
 
 class GraphVisualizer:
     @staticmethod
     def create_and_save_graph(data, output_path):
         G = nx.DiGraph()
 
-        # Color scheme
-        type_colors = {
+        # Color scheme (unknown types get the default grey)
+        type_colors = defaultdict(lambda: "#95A5A6", {
             "Company": "#4A90E2",
             "Risk": "#E74C3C",
             "Dollar Amount": "#2ECC71",
@@ -29,10 +49,11 @@ class GraphVisualizer:
             "Product": "#E67E22",
             "Metric": "#1ABC9C",
             "default": "#95A5A6"
-        }
+        })
 
-        # Add nodes
+        # Add nodes (collected first, then added to the graph in one call)
         node_types = {}
+        graph_nodes = []
         for entity in data.get("entities", []):
             if not isinstance(entity, dict):
                 continue
@@ -41,12 +62,15 @@ class GraphVisualizer:
                 continue
             entity_type = entity.get("type", "default")
             metadata = entity.get("metadata") or entity.get("description") or ""
-            G.add_node(entity_id, type=entity_type, metadata=metadata)
+            graph_nodes.append((entity_id, {"type": entity_type, "metadata": metadata}))
             node_types[entity_id] = entity_type
+        G.add_nodes_from(graph_nodes)
         
-        logger.info(f"Added {len(G.nodes())} nodes to the graph")
+        logger.info(f"Added {G.number_of_nodes()} nodes to the graph")
 
-        # Add edges
+        # Add edges (node_types holds every node added so far)
+        missing_nodes = []
+        graph_edges = []
         for rel in data.get("relationships", []):
             relation = rel.get("relation") or rel.get("type") or rel.get("relationship") or "RELATED_TO"
             source = rel.get("source") or rel.get("entity1") or rel.get("from")
@@ -57,22 +81,23 @@ class GraphVisualizer:
                 continue
             
             # Add missing nodes if needed
-            if source not in G.nodes():
-                G.add_node(source, type="default")
+            if source not in node_types:
+                missing_nodes.append((source, {"type": "default"}))
                 node_types[source] = "default"
-            if target not in G.nodes():
-                G.add_node(target, type="default")
+            if target not in node_types:
+                missing_nodes.append((target, {"type": "default"}))
                 node_types[target] = "default"
             
-            G.add_edge(source, target, label=relation)
+            graph_edges.append((source, target, {"label": relation}))
+        G.add_nodes_from(missing_nodes)
+        G.add_edges_from(graph_edges)
         
         logger.info(f"Added {len(G.edges())} edges to the graph")
 
-        # Find isolated nodes and connect them to main node
-        all_nodes = set(G.nodes())
-        nodes_with_edges = {node for edge in G.edges() for node in edge}
-        isolated_nodes = all_nodes - nodes_with_edges
+        # Find isolated nodes (no edge in either direction) and connect them to main node
+        isolated_nodes = [node for node, degree in G.degree() if degree == 0]
         
+        main_node = None
         if isolated_nodes:
             logger.info(f"Found {len(isolated_nodes)} isolated nodes: {isolated_nodes}")
             
@@ -85,14 +110,14 @@ class GraphVisualizer:
                 "Reliance"
             ]
             
-            main_node = None
             for candidate in main_node_candidates:
-                if candidate in G.nodes():
+                if candidate in G:
                     main_node = candidate
                     break
             
-            if not main_node and len(G.nodes()) > 0:
-                main_node = max(G.nodes(), key=lambda n: G.degree(n))
+            if not main_node and G.number_of_nodes() > 0:
+                # One pass over the degree view (first node wins ties, as before)
+                main_node = max(G.degree(), key=lambda item: item[1])[0]
                 logger.info(f"Using node with most connections as main: {main_node}")
             
             # Connect isolated nodes to main node
@@ -114,18 +139,23 @@ class GraphVisualizer:
                     logger.info(f"Connected {node} ({node_type}) to {main_node} with {relation}")
 
         # Create figure with dynamic sizing
-        num_nodes = len(G.nodes())
+        num_nodes = G.number_of_nodes()
         fig_size = (30, 22) if num_nodes <= 15 else (45, 34) if num_nodes <= 30 else (50, 45) if num_nodes <= 50 else (60, 50)
-        fig, ax = plt.subplots(figsize=fig_size, facecolor='white', dpi=200)
+        # A standalone Agg figure: no pyplot figure manager / GUI backend, and savefig doesn't trigger
+        # pyplot's extra redraw of the whole figure afterwards
+        fig = Figure(figsize=fig_size, facecolor='white', dpi=Config.FIG_DPI)
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
 
         # Calculate layout
-        pos = GraphVisualizer._calculate_layout(G, num_nodes, main_node if main_node else None)
+        pos = GraphVisualizer._calculate_layout(G, num_nodes, main_node)
 
         # Draw edges
         edges = list(G.edges())
         if edges:
-            edge_colors = [GraphVisualizer._get_edge_color(G[u][v].get('label', 'RELATED_TO')) 
-                          for u, v in edges]
+            # (edge data view: same order as edges, without a G[u][v] lookup per edge)
+            edge_colors = [GraphVisualizer._get_edge_color(relation)
+                           for _, _, relation in G.edges(data='label', default='RELATED_TO')]
             
             # Draw edges with variable curvature
             for i, (u, v) in enumerate(edges):
@@ -148,8 +178,7 @@ class GraphVisualizer:
 
         # Draw nodes
         node_size = 4000 if num_nodes <= 10 else 3500 if num_nodes <= 20 else 3000 if num_nodes <= 40 else 2500
-        node_colors = [type_colors.get(node_types.get(node, "default"), type_colors["default"]) 
-                      for node in G.nodes()]
+        node_colors = [type_colors[node_types.get(node, "default")] for node in G.nodes()]
         
         nx.draw_networkx_nodes(G, pos,
                               node_color=node_colors,
@@ -215,7 +244,7 @@ class GraphVisualizer:
 
         # Add legend
         unique_types = set(node_types.values())
-        legend_elements = [mpatches.Patch(facecolor=type_colors.get(t, type_colors["default"]),
+        legend_elements = [mpatches.Patch(facecolor=type_colors[t],
                                           edgecolor='white',
                                           label=t,
                                           linewidth=1.5)
@@ -237,9 +266,8 @@ class GraphVisualizer:
                     pad=25,
                     color='#2C3E50')
         ax.axis('off')
-        plt.tight_layout()
-        plt.savefig(output_path, dpi=300, bbox_inches='tight', facecolor='white', pad_inches=0.2)
-        plt.close()
+        fig.tight_layout()
+        fig.savefig(output_path, dpi=Config.FIG_DPI, bbox_inches='tight', facecolor='white', pad_inches=0.2)
         logger.info(f"Graph visualization saved to {output_path}")
 
     @staticmethod
@@ -302,7 +330,7 @@ class GraphVisualizer:
             except:
                 return nx.spring_layout(G, k=3.0, iterations=250, seed=42)
         else:
-            if main_node and main_node in G.nodes():
+            if main_node and main_node in G:
                 try:
                     pos = nx.circular_layout(G)
                     main_pos = pos[main_node]
@@ -323,20 +351,14 @@ class GraphVisualizer:
             return nx.spring_layout(G, k=2.0, iterations=200, seed=42)
 
     @staticmethod
+    @lru_cache(maxsize=1024)
     def _get_edge_color(relation):
-        """Get color for edge based on relationship type."""
+        """Get color for edge based on relationship type (memoized - a graph only has a few distinct relations)."""
         rel_str = str(relation).upper()
-        if any(rel in rel_str for rel in ['OWNS', 'SUBSIDIARY', 'ACQUIRED']):
-            return '#E74C3C'  # Red
-        elif any(rel in rel_str for rel in ['HAS_PROFIT', 'HAS_REVENUE', 'HAS_ASSET', 'HAS_DEBT', 'HAS_EQUITY']):
-            return '#2ECC71'  # Green
-        elif any(rel in rel_str for rel in ['CHAIRMAN', 'FOUNDER', 'CEO', 'DIRECTOR', 'EMPLOYS']):
-            return '#3498DB'  # Blue
-        elif 'FACES_RISK' in rel_str:
-            return '#E67E22'  # Orange
-        elif any(rel in rel_str for rel in ['FOLLOWS', 'USES']):
-            return '#9B59B6'  # Purple
-        return '#7F8C8D'  # Gray
+        for keywords, color in _EDGE_COLOR_RULES:
+            if any(keyword in rel_str for keyword in keywords):
+                return color
+        return _DEFAULT_EDGE_COLOR
 
     @staticmethod
     def _create_node_labels(G, node_types, edge_labels, main_node, num_nodes, entity_data_map=None):
@@ -344,9 +366,7 @@ class GraphVisualizer:
         max_label_len = 80 if num_nodes <= 10 else 75 if num_nodes <= 20 else 70 if num_nodes <= 40 else 65
         
         # Find isolated nodes (nodes without any edges)
-        all_nodes = set(G.nodes())
-        nodes_with_edges = {node for edge in G.edges() for node in edge}
-        isolated_nodes = all_nodes - nodes_with_edges
+        isolated_nodes = {node for node, degree in G.degree() if degree == 0}
         
         # Create edge labels dict to get formatted labels
         edge_labels_dict = GraphVisualizer._create_edge_labels(
@@ -380,8 +400,7 @@ class GraphVisualizer:
                 label = original_node.replace('\\$', '$')  # Unescape if escaped
             elif original_node.startswith('US ') and any(c.isdigit() for c in original_node):
                 # Pattern: "US 38.7 billion" -> convert to "$ 38.7 billion"
-                import re
-                label = re.sub(r'^US\s+', '$ ', original_node)
+                label = '$ ' + original_node[2:].lstrip()
             elif original_node.startswith('US$'):
                 # Pattern: "US$ 38.7 billion" -> keep as is or convert to "$ 38.7 billion"
                 label = original_node.replace('US$', '$')
@@ -401,11 +420,10 @@ class GraphVisualizer:
                         if isinstance(rel_label, str):
                             rel_label = rel_label.replace('\\$', '$')
                             # Convert "US " to "$ " and "US$" to "$"
-                            import re
                             if 'US$' in rel_label:
                                 rel_label = rel_label.replace('US$', '$')
-                            elif re.match(r'.*US\s+\d', rel_label):
-                                rel_label = re.sub(r'US\s+', '$ ', rel_label)
+                            elif _US_AMOUNT_RE.match(rel_label):
+                                rel_label = _US_RE.sub('$ ', rel_label)
                         relationship_parts.append(rel_label)
                 
                 # Add outgoing relationships (what this node connects TO)
@@ -415,11 +433,10 @@ class GraphVisualizer:
                         if isinstance(rel_label, str):
                             rel_label = rel_label.replace('\\$', '$')
                             # Convert "US " to "$ " and "US$" to "$"
-                            import re
                             if 'US$' in rel_label:
                                 rel_label = rel_label.replace('US$', '$')
-                            elif re.match(r'.*US\s+\d', rel_label):
-                                rel_label = re.sub(r'US\s+', '$ ', rel_label)
+                            elif _US_AMOUNT_RE.match(rel_label):
+                                rel_label = _US_RE.sub('$ ', rel_label)
                         relationship_parts.append(rel_label)
                 
                 # For isolated nodes, add metadata/description to label
@@ -449,29 +466,40 @@ class GraphVisualizer:
                     label = f"{label} ({rel_text})"
             
             # Truncate if too long
-            max_len = max_label_len * 2 if is_main_node else max_label_len
-            if len(label) > max_len:
-                words = label.split()
-                truncated = ""
-                for word in words:
-                    if len(truncated + word) <= max_len - 3:
-                        truncated += word + " "
-                    else:
-                        break
-                label = truncated.strip() + "..." if truncated else label[:max_len-3] + "..."
-            
-            labels[node] = label
+            labels[node] = GraphVisualizer._truncate_label(label, max_label_len * 2 if is_main_node else max_label_len)
         
         return labels
 
+    @staticmethod
+    def _truncate_label(label, max_len):
+        """Cut label to max_len characters (with "..."), at a word boundary when possible."""
+        if len(label) <= max_len:
+            return label
+        # Count the words that fit, tracking the joined length instead of rebuilding the string per word
+        words = label.split()
+        word_count = 0
+        joined_length = 0
+        for word in words:
+            if joined_length + len(word) > max_len - 3:
+                break
+            joined_length += len(word) + 1
+            word_count += 1
+        return " ".join(words[:word_count]) + "..." if word_count else label[:max_len-3] + "..."
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _format_relation(relation):
+        """Upper-case key and display form of a relation ("has_revenue" -> "HAS_REVENUE", "Has Revenue"), once per relation."""
+        rel_str = str(relation).strip().upper()
+        return rel_str, ' '.join(word.capitalize() for word in rel_str.replace('_', ' ').replace('-', ' ').split())
+
     @staticmethod
     def _create_edge_labels(G, edge_labels, node_types, entity_data_map):
         """Create formatted labels for edges."""
         edge_labels_dict = {}
         
         for (u, v), relation in edge_labels.items():
-            rel_str = str(relation).strip().upper()
-            rel_formatted = ' '.join(word.capitalize() for word in rel_str.replace('_', ' ').replace('-', ' ').split())
+            rel_str, rel_formatted = GraphVisualizer._format_relation(relation)
             
             target_name = str(v).strip()
             # Ensure dollar signs are preserved (matplotlib may escape them)
@@ -514,15 +542,8 @@ class GraphVisualizer:
                             edge_label = f"Growth is {target_name}"
                 else:
                     edge_label = f"{target_metadata[:45]}: {target_name}" if target_metadata else (f"{target_description[:45]}: {target_name}" if target_description else target_name)
-            elif any(rel in rel_str for rel in ['OWNS', 'PRODUCES', 'EMPLOYS', 'OPERATES', 'PARTNERS_WITH']):
-                edge_label = f"{rel_formatted}: {target_name}"
-            elif any(rel in rel_str for rel in ['HAS_REVENUE', 'HAS_PROFIT', 'HAS_ASSET', 'HAS_DEBT', 'HAS_EQUITY', 'HAS_EXPORTS', 'HAS_CSR_CONTRIBUTION']):
-                edge_label = f"{rel_formatted}: {target_name}"
-            elif any(rel in rel_str for rel in ['CHAIRMAN', 'FOUNDER', 'MANAGING_DIRECTOR', 'CEO', 'DIRECTOR']):
-                # For personnel relationships, show relation with target entity name
-                edge_label = f"{rel_formatted}: {target_name}"
             else:
-                # Default: show relation with target entity name
+                # Ownership, financial, personnel and any other relation: show relation with target entity name
                 edge_label = f"{rel_formatted}: {target_name}"
             
             # Truncate if too long
@@ -2,9 +2,13 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+import tempfile
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
+from src.config import Config
 from src.extractor import FinancialDetective
+from src.llm_engine import _system_message
+from src.utils import clean_json_string
 
 class TestFinancialDetective(unittest.TestCase):
     def test_analyze_structure(self):
@@ -28,5 +32,117 @@ class TestFinancialDetective(unittest.TestCase):
         self.assertIn("relationships", result)
         self.assertEqual(result["entities"][0]["id"], "RIL")
 
+    def test_analyze_uses_cache(self):
+        """
+        Test that a second analyze() on the same text is served from the cache without calling the LLM.
+        """
+        mock_response = '{"entities": [{"id": "RIL", "type": "Company"}], "relationships": []}'
+        
+        with tempfile.TemporaryDirectory() as cache_dir:
+            detective = FinancialDetective(cache_dir=cache_dir)
+            detective.llm.generate_extraction = MagicMock(return_value=mock_response)
+            
+            first = detective.analyze("Some raw text")
+            second = detective.analyze("Some  raw\ntext ")  # whitespace-only difference
+            
+            self.assertEqual(detective.llm.generate_extraction.call_count, 1)
+            self.assertEqual(first, second)
+            
+            # A new instance has an empty in-memory cache, so this one is served from disk
+            fresh = FinancialDetective(cache_dir=cache_dir)
+            fresh.llm.generate_extraction = MagicMock(return_value=mock_response)
+            
+            self.assertEqual(fresh.analyze("Some raw text"), first)
+            fresh.llm.generate_extraction.assert_not_called()
+
+    @patch("src.extractor.time.sleep")
+    def test_analyze_retries_invalid_response_with_feedback(self, _sleep):
+        """
+        Test that a response failing validation is re-requested with the error, and the fixed one is used.
+        """
+        invalid_response = '{"entities": [{"type": "Company"}], "relationships": []}'  # entity without id
+        valid_response = '{"entities": [{"id": "RIL", "type": "Company"}], "relationships": []}'
+        
+        detective = FinancialDetective()
+        detective.llm.generate_extraction = MagicMock(side_effect=[invalid_response, valid_response])
+        
+        result = detective.analyze("Some raw text")
+        
+        self.assertEqual(detective.llm.generate_extraction.call_count, 2)
+        feedback = detective.llm.generate_extraction.call_args.kwargs["feedback"]
+        self.assertEqual(feedback[0][0], invalid_response)
+        self.assertIn("entities.0.id", feedback[0][1])
+        self.assertEqual(result["entities"][0]["id"], "RIL")
+
+    @patch("src.extractor.Config.MEMORY_CACHE_SIZE", 0)
+    @patch("src.extractor.Config.CHUNK_OVERLAP", 0)
+    @patch("src.extractor.Config.CHUNK_SIZE", 100)
+    @patch("src.extractor.Config.CHUNKS_PER_LLM_CALL", 2)
+    def test_chunks_batched_into_one_llm_call(self):
+        """
+        Test that chunks are packed into one request and the per-segment results are merged.
+        """
+        batched_response = ('{"results": [{"entities": [{"id": "RIL", "type": "Company"}], "relationships": []}, '
+                            '{"entities": [{"id": "Jio", "type": "Company"}], "relationships": []}]}')
+        
+        detective = FinancialDetective()
+        detective.cache = None
+        detective.llm.generate_extraction = MagicMock(return_value=batched_response)
+        
+        result = detective.analyze("x" * 200)  # two chunks
+        
+        self.assertEqual(detective.llm.generate_extraction.call_count, 1)
+        self.assertIn("--- SEGMENT 2 ---", detective.llm.generate_extraction.call_args.args[1])
+        self.assertEqual(sorted(e["id"] for e in result["entities"]), ["Jio", "RIL"])
+
+    def test_system_prompt_is_identical_across_chunks(self):
+        """
+        Test that only the user message varies between requests, so the server can reuse the cached prompt prefix.
+        """
+        detective = FinancialDetective()
+        prompt = detective.get_extraction_prompt()
+        
+        first = detective.llm._build_messages(prompt, "First chunk")
+        second = detective.llm._build_messages(prompt, "Second chunk", detective.get_existing_context({"RIL"}),
+                                               feedback=[("{}", "entities: Field required")])
+        
+        self.assertEqual(first[0], second[0])
+        self.assertTrue(first[0]["content"].endswith(prompt))
+        self.assertEqual(detective.llm._request_headers(first), detective.llm._request_headers(second))
+
+    def test_system_message_fits_prompt_budget(self):
+        """
+        Test that PROMPT_TOKENS (used for MAX_CONTEXT_CHARS) covers the system message at CHARS_PER_TOKEN.
+        """
+        detective = FinancialDetective()
+        
+        system_chars = len(_system_message(detective.get_extraction_prompt())["content"])
+        
+        self.assertLessEqual(system_chars // Config.CHARS_PER_TOKEN, Config.PROMPT_TOKENS)
+
+    @patch("src.llm_engine.Config.LLM_FEEDBACK_CHARS", 100)
+    def test_feedback_replays_only_end_of_long_answer(self):
+        """
+        Test that a long rejected answer (e.g. cut off at MAX_TOKENS) is shortened to its end when replayed.
+        """
+        detective = FinancialDetective()
+        rejected = '{"entities": [' + '{"id": "RIL"}, ' * 50 + '{"id": "Ji'
+        
+        messages = detective.llm._build_messages(detective.get_extraction_prompt(), "Some raw text",
+                                                 feedback=[(rejected, "Invalid JSON"), (rejected, "Invalid JSON")])
+        
+        replayed = [m["content"] for m in messages if m["role"] == "assistant"]
+        self.assertEqual(replayed, ["..." + rejected[-100:]] * 2)
+
+    def test_clean_json_string_truncated_response(self):
+        """
+        Test that a response cut off mid-object (unbalanced braces) is handled instead of hanging.
+        """
+        truncated = '{"entities": [{"id": "RIL", "type": "Company"}, {"id": "Ji'
+        
+        result = clean_json_string(truncated)
+        
+        self.assertEqual(result, '{"id": "RIL", "type": "Company"}')
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file